@@ -1,31 +1,69 @@
-from typing import NamedTuple
+import asyncio
+from datetime import datetime
+from functools import partial
+from typing import TYPE_CHECKING, NamedTuple
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryAuthFailed, ConfigEntryNotReady
 from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
 
-from .api import Device, EldomAPI
+from .api import (
+    Device,
+    DeviceState,
+    EldomAPI,
+    EldomAuthError,
+    EldomUnavailableError,
+)
 from .const import (
+    CONF_DEVICES,
     CONF_ENDPOINT,
+    CONF_ENERGY_STATISTICS,
+    CONF_MAX_CONCURRENT,
     CONF_PASSWORD,
     CONF_POLL_INTERVAL,
     CONF_POLL_INTERVAL_FAST,
+    CONF_POLL_MODE,
+    CONF_TRACE,
+    CONF_TRANSPORT,
     CONF_USERNAME,
     DEFAULT_FAST_POLL,
+    DEFAULT_MAX_CONCURRENT,
     DEFAULT_NORMAL_POLL,
+    DEFAULT_POLL_MODE,
+    DEFAULT_TRANSPORT,
+    DEVICE_DISCOVERY_INTERVAL,
     DOMAIN,
     LOGGER,
     PLATFORMS,
+    POLL_MODE_ACCOUNT,
+    POLL_MODE_CONDITIONAL,
+    SIGNAL_DEVICES_ADDED,
+    STARTUP_STATE_TIMEOUT,
+    TRACE_FILE,
 )
-from .coordinator import EldomCoordinator
+from .clients import SharedClient, async_acquire_client, async_release_client
+from .coordinator import EldomAccountCoordinator, EldomCoordinator
+from .store import EldomStateStore, async_get_session_store, async_load_state_store
+from .tracing import RequestTracer
+
+if TYPE_CHECKING:
+    from .energy_statistics import EldomEnergyStatistics
 
 
 class HomeAssistantEldomData(NamedTuple):
     """Smart Life data stored in the Home Assistant data object."""
 
     api: EldomAPI
+    client: SharedClient
     coordinators: dict[str, EldomCoordinator]
     devices: dict[str, Device]
+    statistics: dict[str, "EldomEnergyStatistics"]
+    account: EldomAccountCoordinator | None = None
+    conf: dict | None = None
+    snapshot: EldomStateStore | None = None
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
@@ -33,71 +71,318 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     LOGGER.debug("Setting up configuration for Eldom devices!")
     hass.data.setdefault(DOMAIN, {})
 
+    endpoint = entry.data[CONF_ENDPOINT]
+    username = entry.data[CONF_USERNAME]
     if hass.data[DOMAIN].get(entry.entry_id) is None:
+        # entries of the same account share one logged in client
+        client = async_acquire_client(hass, endpoint, username, entry.entry_id)
         hass_data = HomeAssistantEldomData(
-            api=EldomAPI(entry.data[CONF_ENDPOINT]), devices={}, coordinators={}
+            api=client.api,
+            client=client,
+            devices={},
+            coordinators={},
+            statistics={},
         )
         hass.data[DOMAIN][entry.entry_id] = hass_data
     else:
         hass_data: HomeAssistantEldomData = hass.data[DOMAIN][entry.entry_id]
 
     api = hass_data.api
+    client = hass_data.client
     devices = hass_data.devices
     coordinators = hass_data.coordinators
 
-    conf = {
-        CONF_POLL_INTERVAL: DEFAULT_NORMAL_POLL,
-        CONF_POLL_INTERVAL_FAST: DEFAULT_FAST_POLL,
-    }
+    conf = _entry_conf(entry)
 
-    # login
-    lr = await hass.async_add_executor_job(
-        api.login, entry.data[CONF_USERNAME], entry.data[CONF_PASSWORD]
-    )
-    LOGGER.debug("login %s", lr)
+    account = None
+    if conf[CONF_POLL_MODE] in (POLL_MODE_ACCOUNT, POLL_MODE_CONDITIONAL):
+        # one poll cycle for all devices, coordinators get their slice of it
+        account = EldomAccountCoordinator(hass, api, devices, coordinators, conf)
+    # last known devices and states, shown until the cloud answers
+    snapshot = await async_load_state_store(hass, entry.entry_id)
+    restored = snapshot.devices if not devices else {}
+    hass_data = hass_data._replace(account=account, conf=conf, snapshot=snapshot)
+    hass.data[DOMAIN][entry.entry_id] = hass_data
+
+    if conf[CONF_TRACE] and api.tracer is None:
+        api.tracer = RequestTracer(hass.config.path(TRACE_FILE.format(entry.entry_id)))
+        LOGGER.info("Tracing Eldom requests to %s", api.tracer.path)
+
+    # reuse the saved session, login only if there is none or it is rejected
+    sessions = await async_get_session_store(hass)
+    api.session_listener = partial(sessions.async_set, endpoint, username)
+    password = entry.data[CONF_PASSWORD]
+    try:
+        # the first entry of the account logs in, the others use its session
+        async with client.login_lock:
+            if client.password is None:
+                if (
+                    not api.restore_session(
+                        username, password, sessions.get(endpoint, username)
+                    )
+                    and not restored
+                ):
+                    if not await api.login(username, password):
+                        raise EldomAuthError(f"Login of {username} failed")
+                client.password = password
+            elif client.password != password:
+                # an entry of the account with another password, it is checked
+                # and used from now on
+                if not await api.login(username, password):
+                    raise EldomAuthError(f"Login of {username} failed")
+                client.password = password
 
-    # get devices
-    result = await hass.async_add_executor_job(api.get_devices)
-    LOGGER.debug("get_devices %s devices", len(result))
+        if restored:
+            # the cloud is asked in the background, the first request logs in
+            devices.update(restored)
+            LOGGER.debug("restored %s devices", len(restored))
+        else:
+            # get devices
+            result = await api.get_devices()
+            LOGGER.debug("get_devices %s devices", len(result))
 
-    # populate
-    for dev in result:
-        devices[dev.real_device_id] = dev
+            # populate
+            for dev in result:
+                devices[dev.real_device_id] = dev
+    except EldomAuthError as err:
+        await _async_release_data(hass, entry)
+        raise ConfigEntryAuthFailed(str(err)) from err
+    except (RuntimeError, KeyError, TypeError, ValueError) as err:
+        # unavailable or answering with something else, setup is retried
+        await _async_release_data(hass, entry)
+        raise ConfigEntryNotReady(str(err)) from err
+
+    # account device holding the diagnostic entities
+    device_registry = dr.async_get(hass)
+    device_registry.async_get_or_create(
+        config_entry_id=entry.entry_id,
+        identifiers={(DOMAIN, entry.entry_id)},
+        name=f"Eldom {username}",
+        manufacturer="Eldom",
+        entry_type=dr.DeviceEntryType.SERVICE,
+        configuration_url=endpoint,
+    )
 
     # Create one coordinator for each device
     for id, device in devices.items():
-        # Create device
-        device_registry = dr.async_get(hass)
-        LOGGER.debug("adding device %s", device)
-        device_registry.async_get_or_create(
-            config_entry_id=entry.entry_id,
-            identifiers={(DOMAIN, id)},
-            name=device.display_name,
-            hw_version=device.hw_version,
-            sw_version=device.sw_version,
-            model=f"{device.device_type.name} (unsupported)",
-            configuration_url=f"{api._endpoint}/#/device/flatboiler/{device.id}",
-        )
-        state = await hass.async_add_executor_job(api.get_state, device)
-        # Set up coordinator
-        coordinators[id] = EldomCoordinator(hass, api, id, device, state, conf)
+        _add_device(hass, entry, hass_data, conf, id, device, snapshot.state(id))
     # clean up device entities
-    await cleanup_device_registry(hass, devices)
+    await cleanup_device_registry(hass, entry, devices)
+
+    # fetch initial states concurrently, slow devices fill in after setup
+    semaphore = asyncio.Semaphore(conf[CONF_MAX_CONCURRENT])
+
+    async def _async_initial_refresh(coordinator: EldomCoordinator) -> None:
+        async with semaphore:
+            await coordinator.async_refresh()
+
+    tasks = [
+        entry.async_create_background_task(
+            hass, _async_initial_refresh(c), f"{DOMAIN} initial state {id}"
+        )
+        for id, c in coordinators.items()
+    ]
+    if tasks and not restored:
+        _, pending = await asyncio.wait(tasks, timeout=STARTUP_STATE_TIMEOUT)
+        LOGGER.debug("%s of %s device states pending", len(pending), len(tasks))
+
+    # hourly energy statistics in the recorder
+    for id in coordinators:
+        _start_statistics(hass, entry, hass_data, id)
+
+    # pick up heaters added to or removed from the account
+    async def _async_discover(now: datetime) -> None:
+        await _async_discover_devices(hass, entry, hass_data, conf)
+
+    entry.async_on_unload(
+        async_track_time_interval(
+            hass,
+            _async_discover,
+            DEVICE_DISCOVERY_INTERVAL,
+            name=f"{DOMAIN} device discovery",
+            cancel_on_shutdown=True,
+        )
+    )
+
+    # poll schedules from the options flow apply without a reload
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
 
     # Forward the setup to the platforms.
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    if restored:
+        entry.async_create_background_task(
+            hass,
+            _async_discover_devices(hass, entry, hass_data, conf),
+            f"{DOMAIN} device discovery",
+        )
     return True
 
 
+def _entry_conf(entry: ConfigEntry) -> dict:
+    """Account wide settings, changing one of them reloads the entry"""
+    options = entry.options
+    return {
+        CONF_POLL_INTERVAL: DEFAULT_NORMAL_POLL,
+        CONF_POLL_INTERVAL_FAST: DEFAULT_FAST_POLL,
+        CONF_POLL_MODE: options.get(CONF_POLL_MODE, DEFAULT_POLL_MODE),
+        CONF_MAX_CONCURRENT: options.get(CONF_MAX_CONCURRENT, DEFAULT_MAX_CONCURRENT),
+        CONF_TRACE: options.get(CONF_TRACE, False),
+        CONF_ENERGY_STATISTICS: options.get(CONF_ENERGY_STATISTICS, True),
+        CONF_TRANSPORT: options.get(CONF_TRANSPORT, DEFAULT_TRANSPORT),
+    }
+
+
+def _device_conf(entry: ConfigEntry, conf: dict, id: str) -> dict:
+    """Settings of a device, its poll schedule on top of the account settings"""
+    return {**conf, **entry.options.get(CONF_DEVICES, {}).get(id, {})}
+
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    hass_data: HomeAssistantEldomData = hass.data[DOMAIN][entry.entry_id]
+    if _entry_conf(entry) != hass_data.conf:
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+    for id, c in hass_data.coordinators.items():
+        c.set_schedule(_device_conf(entry, hass_data.conf, id))
+    if hass_data.account is not None:
+        hass_data.account.async_reschedule()
+
+
+def _add_device(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    hass_data: HomeAssistantEldomData,
+    conf: dict,
+    id: str,
+    device: Device,
+    state: DeviceState | None = None,
+) -> EldomCoordinator:
+    """Register a device and create its coordinator, the state is fetched later"""
+    LOGGER.debug("adding device %s", device)
+    api = hass_data.api
+    dr.async_get(hass).async_get_or_create(
+        config_entry_id=entry.entry_id,
+        identifiers={(DOMAIN, id)},
+        name=device.display_name,
+        hw_version=device.hw_version,
+        sw_version=device.sw_version,
+        model=f"{device.device_type.name} (unsupported)",
+        configuration_url=f"{api._endpoint}/#/device/flatboiler/{device.id}",
+    )
+    coordinator = EldomCoordinator(
+        hass, api, id, device, state, _device_conf(entry, conf, id), hass_data.account
+    )
+    hass_data.coordinators[id] = coordinator
+    coordinator.start_transport()
+
+    snapshot = hass_data.snapshot
+
+    @callback
+    def _async_save() -> None:
+        snapshot.async_set(id, coordinator.device, coordinator.polled_state)
+
+    entry.async_on_unload(coordinator.async_add_listener(_async_save))
+    return coordinator
+
+
+def _start_statistics(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    hass_data: HomeAssistantEldomData,
+    id: str,
+) -> None:
+    if not hass_data.conf[CONF_ENERGY_STATISTICS]:
+        return
+    if not hass_data.client.is_owner(entry.entry_id):
+        # another entry of the account imports the same statistics
+        return
+    if "recorder" not in hass.config.components:
+        # the recorder is optional, without it there is nowhere to import to
+        return
+    # imported here, the recorder modules load only when it is set up
+    from .energy_statistics import EldomEnergyStatistics
+
+    statistics = EldomEnergyStatistics(hass, hass_data.coordinators[id])
+    hass_data.statistics[id] = statistics
+    entry.async_create_background_task(
+        hass, statistics.async_start(), f"{DOMAIN} energy statistics {id}"
+    )
+
+
+async def _async_discover_devices(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    hass_data: HomeAssistantEldomData,
+    conf: dict,
+) -> None:
+    """Add and remove devices to match the account, without reloading the entry"""
+    try:
+        result = await hass_data.api.get_devices()
+    except (EldomAuthError, EldomUnavailableError) as err:
+        LOGGER.debug("device discovery failed: %s", err)
+        return
+
+    devices = hass_data.devices
+    found = {dev.real_device_id: dev for dev in result}
+    device_registry = dr.async_get(hass)
+
+    removed = [id for id in devices if id not in found]
+    for id in removed:
+        LOGGER.info("%s was removed from the account", devices[id].display_name)
+        del devices[id]
+        hass_data.snapshot.async_remove_device(id)
+        if (statistics := hass_data.statistics.pop(id, None)) is not None:
+            statistics.async_stop()
+        await hass_data.coordinators.pop(id).async_shutdown()
+    if removed:
+        # removing the registry devices removes their entities
+        await cleanup_device_registry(hass, entry, devices)
+
+    added = []
+    for id, device in found.items():
+        old = devices.get(id)
+        devices[id] = device
+        if old is None:
+            LOGGER.info("%s was added to the account", device.display_name)
+            _add_device(hass, entry, hass_data, conf, id, device)
+            added.append(id)
+            continue
+        hass_data.coordinators[id].device = device
+        hass_data.coordinators[id].transport.device = device
+        if (old.hw_version, old.sw_version) != (device.hw_version, device.sw_version):
+            if entry_device := device_registry.async_get_device(
+                identifiers={(DOMAIN, id)}
+            ):
+                device_registry.async_update_device(
+                    entry_device.id,
+                    hw_version=device.hw_version,
+                    sw_version=device.sw_version,
+                )
+
+    if added:
+        await asyncio.gather(
+            *(hass_data.coordinators[id].async_refresh() for id in added)
+        )
+        for id in added:
+            _start_statistics(hass, entry, hass_data, id)
+        async_dispatcher_send(hass, SIGNAL_DEVICES_ADDED.format(entry.entry_id), added)
+
+
 async def cleanup_device_registry(
-    hass: HomeAssistant, devices: dict[str, Device]
+    hass: HomeAssistant, entry: ConfigEntry, devices: dict[str, Device]
 ) -> None:
     """Remove deleted device registry entry if there are no remaining entities."""
     device_registry = dr.async_get(hass)
-    for dev_id, device_entry in list(device_registry.devices.items()):
+    for device_entry in dr.async_entries_for_config_entry(
+        device_registry, entry.entry_id
+    ):
         for item in device_entry.identifiers:
             if item[0] == DOMAIN and item[1] not in devices:
-                device_registry.async_remove_device(dev_id)
+                if item[1] == entry.entry_id:
+                    # the account device
+                    continue
+                device_registry.async_remove_device(device_entry.id)
                 break
 
 
@@ -105,15 +390,45 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unloading the Eldom platforms."""
 
     LOGGER.debug("unload entry id = %s", entry.entry_id)
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    unloaded = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unloaded:
+        # the client is closed with the last entry of the account
+        await _async_release_data(hass, entry)
+    return unloaded
 
 
 async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Remove a config entry."""
     LOGGER.debug("remove entry id = %s", entry.entry_id)
-    hass_data: HomeAssistantEldomData = hass.data[DOMAIN][entry.entry_id]
+    await _async_release_data(hass, entry)
+    await EldomStateStore(hass, entry.entry_id).async_remove()
+    account = (entry.data[CONF_ENDPOINT], entry.data[CONF_USERNAME])
+    if any(
+        (other.data[CONF_ENDPOINT], other.data[CONF_USERNAME]) == account
+        for other in hass.config_entries.async_entries(DOMAIN)
+        if other.entry_id != entry.entry_id
+    ):
+        # the saved session is still used by another entry
+        return
+    sessions = await async_get_session_store(hass)
+    sessions.async_remove(*account)
+
+
+async def _async_release_data(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    hass_data: HomeAssistantEldomData | None = hass.data.get(DOMAIN, {}).get(
+        entry.entry_id
+    )
+    if hass_data is None:
+        return
+    for statistics in hass_data.statistics.values():
+        statistics.async_stop()
     for _, c in hass_data.coordinators.items():
         await c.async_shutdown()
+    if hass_data.account is not None:
+        await hass_data.account.async_shutdown()
+    await async_release_client(
+        hass, entry.data[CONF_ENDPOINT], entry.data[CONF_USERNAME], entry.entry_id
+    )
 
     hass.data[DOMAIN].pop(entry.entry_id)
     if not hass.data[DOMAIN]:
@@ -1,30 +1,56 @@
 from __future__ import annotations
+import asyncio
 import collections
 from dataclasses import dataclass
+from functools import partial
 import datetime
 from enum import Enum
 import json
-from urllib.parse import urlencode, urljoin
+from urllib.parse import urljoin
 import re
-from typing import Optional, Type, TypeVar
-from requests import Response, Session
+from time import monotonic, time
+from json.decoder import scanstring
+from typing import Any, Callable, Optional, Type, TypeVar, get_args, get_origin
+from aiohttp import ClientError, ClientSession, ClientTimeout
+from yarl import URL
+
+from .metrics import LOGIN, ApiMetrics, endpoint_name
+from .scheduler import (
+    CircuitBreaker,
+    PRIORITY_COMMAND,
+    PRIORITY_DEFAULT,
+    PRIORITY_POLL,
+    RequestScheduler,
+)
+from .tracing import RequestTracer
 
 user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 vtoken_pattern = r'<input\s*name="__RequestVerificationToken".*value="(?P<token>.*)"'
 login_request_token_name = "__RequestVerificationToken"
+auth_cookie_name = ".AspNetCore.cookieath"
+login_path = "/Account/Login"
+object_json_pattern = re.compile(r'"objectJson"\s*:\s*"')
 
+DEFAULT_STATE_CACHE_TTL = 2.0
+"""seconds a fetched device state answers get_state without a request"""
 
-class SessionWithUrlBase(Session):
-    def __init__(self, url_base=None, *args, **kwargs):
-        super(SessionWithUrlBase, self).__init__(*args, **kwargs)
-        self.url_base = url_base
+REQUEST_TIMEOUT = ClientTimeout(total=20)
+"""a request taking longer fails and counts against the circuit breaker"""
 
-    def request(self, method, url, **kwargs):
-        modified_url = urljoin(self.url_base, url)
-        return super(SessionWithUrlBase, self).request(method, modified_url, **kwargs)
 
+class EldomAuthError(RuntimeError):
+    """The cloud rejected the session or the credentials."""
 
-@dataclass
+
+class EldomUnavailableError(RuntimeError):
+    """The cloud cannot be reached or fails to answer."""
+
+
+class EldomUnsupportedError(RuntimeError):
+    """The endpoint does not implement the request."""
+
+
+@dataclass(slots=True)
 class User:
     id: int
     email: str
@@ -51,7 +77,7 @@ class DeviceType(Enum):
     FLAT_WATER_HEATER = 7
 
 
-@dataclass
+@dataclass(slots=True)
 class Device:
     id: int
     real_device_id: str
@@ -81,7 +107,7 @@ class Device:
             self.display_name = f"Unknown type:{self.device_type}"
 
 
-@dataclass
+@dataclass(slots=True)
 class DeviceState:
     device_id: str
     state: Mode
@@ -108,6 +134,7 @@ class DeviceState:
     current_temp: Optional[int] = None
     heating_active: Optional[bool] = None
     energy_total: Optional[float] = None
+    saved_energy_kwh: Optional[float] = None
 
     def _init(self):
         if isinstance(self.state, int):
@@ -210,11 +237,8 @@ class data_utils:
     def display_name_from_type(type: DeviceType) -> str:
         return data_utils._display_names[type]
 
-    @staticmethod
-    def _init(obj):
-        if hasattr(obj, "_init") and callable(obj._init):
-            obj._init()
-        return obj
+    _decoders: dict = {}
+    _encoders: dict = {}
 
     @staticmethod
     def _value(value):
@@ -223,52 +247,64 @@ class data_utils:
         return value
 
     @staticmethod
-    def from_json(content: str, cls: Type[U]) -> U:
-        kvs = json.loads(content)
-        if isinstance(kvs, (collections.abc.Sequence)):
-            res = []
-            if cls.__origin__ == list:
-                cls = cls.__args__[0]
-            type_mappings = data_utils._mappings[cls]
-            for item in kvs:
-                p = {}
-                for k, v in type_mappings.items():
-                    if v in item:
-                        p[k] = item[v]
-                res.append(data_utils._init(cls(**p)))
-            return res
+    def _decoder(cls) -> Callable[[Any], Any]:
+        """decoder of cls, built once from the field mappings"""
+        decoder = data_utils._decoders.get(cls)
+        if decoder is not None:
+            return decoder
+
+        if get_origin(cls) is list:
+            item_decoder = data_utils._decoder(get_args(cls)[0])
+
+            def decoder(kvs):
+                return [item_decoder(item) for item in kvs]
+
         else:
-            p = {}
-            type_mappings = data_utils._mappings[cls]
-            for k, v in type_mappings.items():
-                if v in kvs:
-                    p[k] = kvs[v]
-            return data_utils._init(cls(**p))
+            fields = tuple(data_utils._mappings[cls].items())
+            init = getattr(cls, "_init", None)
+
+            def decoder(kvs):
+                obj = cls(**{k: kvs[v] for k, v in fields if v in kvs})
+                if init is not None:
+                    init(obj)
+                return obj
+
+        data_utils._decoders[cls] = decoder
+        return decoder
 
     @staticmethod
-    def to_json(obj) -> str:
+    def _encoder(cls) -> Callable[[Any], dict]:
+        """encoder of cls, built once from the field mappings"""
+        encoder = data_utils._encoders.get(cls)
+        if encoder is not None:
+            return encoder
+
+        fields = tuple(data_utils._mappings[cls].items())
+        value = data_utils._value
+
+        def encoder(obj):
+            return {v: value(getattr(obj, k)) for k, v in fields}
+
+        data_utils._encoders[cls] = encoder
+        return encoder
+
+    @staticmethod
+    def from_dict(kvs, cls: Type[U]) -> U:
+        return data_utils._decoder(cls)(kvs)
+
+    @staticmethod
+    def from_json(content: str, cls: Type[U]) -> U:
+        return data_utils._decoder(cls)(json.loads(content))
+
+    @staticmethod
+    def to_dict(obj):
         if isinstance(obj, (collections.abc.Sequence)):
-            type_mappings = None
-            res = []
-            for item in obj:
-                r = {}
-                type_mappings = (
-                    type_mappings
-                    if type_mappings is not None
-                    else data_utils._mappings[type(item)]
-                )
-                for name, value in vars(item).items():
-                    if name in type_mappings:
-                        r[type_mappings[name]] = data_utils._value(value)
-                res.append(r)
-            return json.dumps(res)
-        else:
-            r = {}
-            type_mappings = data_utils._mappings[type(obj)]
-            for name, value in vars(obj).items():
-                if name in type_mappings:
-                    r[type_mappings[name]] = data_utils._value(value)
-            return json.dumps(r)
+            return [data_utils._encoder(type(item))(item) for item in obj]
+        return data_utils._encoder(type(obj))(obj)
+
+    @staticmethod
+    def to_json(obj) -> str:
+        return json.dumps(data_utils.to_dict(obj))
 
 
 class EldomAPI:
@@ -276,112 +312,344 @@ class EldomAPI:
     Eldom API client need to have success login to be able to operate with devices
     """
 
-    _session: Session
+    _session: ClientSession
     _endpoint: str
 
-    def __init__(self, endpoint: str) -> None:
+    session_listener: Optional[Callable[[dict[str, str]], None]] = None
+    """called with the session cookies after each successful login"""
+
+    tracer: Optional[RequestTracer] = None
+    """set to trace every request to a file"""
+
+    def __init__(
+        self,
+        endpoint: str,
+        session: ClientSession,
+        scheduler: Optional[RequestScheduler] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        state_cache_ttl: float = DEFAULT_STATE_CACHE_TTL,
+    ) -> None:
         """init"""
         self._endpoint = endpoint
-        self._session = SessionWithUrlBase(url_base=endpoint)
-
-    def login(self, user: str, password: str) -> bool:
-        self._session.headers.update(
-            {"User-Agent": user_agent, "Referer": self._endpoint + "/"}
+        self._session = session
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.metrics = ApiMetrics()
+        self._headers = {"User-Agent": user_agent, "Referer": endpoint + "/"}
+        self._credentials: Optional[tuple[str, str]] = None
+        self._login_lock = asyncio.Lock()
+        self._login_generation = 0
+        # get_state requests in flight and their recent results, by device id
+        self.state_cache_ttl = state_cache_ttl
+        self._state_inflight: dict[int, asyncio.Task[DeviceState]] = {}
+        self._state_cache: dict[int, tuple[float, DeviceState]] = {}
+        # whether the endpoint answers long polls, None until probed
+        self._long_poll: Optional[bool] = None
+        self._long_poll_lock = asyncio.Lock()
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        priority: int = PRIORITY_DEFAULT,
+        closes_breaker: bool = True,
+        **kwargs,
+    ) -> tuple[URL, int, bytes]:
+        if not self.breaker.allow():
+            raise EldomUnavailableError(
+                f"Eldom cloud unavailable, retrying in {self.breaker.retry_in():.0f}s"
+            )
+        await self.scheduler.acquire(priority)
+        headers = {**self._headers, **kwargs.pop("headers", {})}
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        start = monotonic()
+        try:
+            async with self._session.request(
+                method, urljoin(self._endpoint, url), headers=headers, **kwargs
+            ) as res:
+                result = res.url, res.status, await res.read()
+                redirected = bool(res.history)
+        except (ClientError, asyncio.TimeoutError) as e:
+            duration = monotonic() - start
+            self.metrics.record(endpoint_name(method, url), duration, 0, False)
+            if self.tracer is not None:
+                self._trace(method, url, duration, None, kwargs, None, repr(e))
+            self.breaker.failure()
+            raise EldomUnavailableError(f"{url} failed: {e!r}") from e
+        _, status, content = result
+        duration = monotonic() - start
+        self.metrics.record(
+            endpoint_name(method, url), duration, len(content), status < 400
+        )
+        if self.tracer is not None:
+            self._trace(method, url, duration, status, kwargs, content)
+        if status >= 500:
+            self.breaker.failure()
+            raise EldomUnavailableError(f"{url} failed with status {status}")
+        # only the answer to the request itself shows the cloud works again,
+        # not a redirect to the login page or the login requests
+        if closes_breaker and 200 <= status < 300 and not redirected:
+            self.breaker.success()
+        return result
+
+    def _trace(
+        self,
+        method: str,
+        url: str,
+        duration: float,
+        status: Optional[int],
+        kwargs: dict,
+        content: Optional[bytes],
+        error: Optional[str] = None,
+    ) -> None:
+        end = time()
+        request = kwargs.get("json", kwargs.get("data"))
+        self.tracer.trace(
+            method, url, end - duration, end, status, request, content, error
         )
-        res = self._session.get("/Account/Login")
-        content = str(res.content)
 
-        result = re.search(vtoken_pattern, content)
+    async def _request(
+        self, method: str, url: str, priority: int = PRIORITY_DEFAULT, **kwargs
+    ) -> tuple[URL, int, bytes]:
+        generation = self._login_generation
+        res = await self._send(method, url, priority, **kwargs)
+        if not self._is_rejected(*res):
+            return res
+
+        # the saved or current session has expired, login once and retry
+        if self._credentials is None:
+            raise EldomAuthError(f"Session rejected for {url}")
+        await self._relogin(generation)
+        res = await self._send(method, url, priority, **kwargs)
+        if self._is_rejected(*res):
+            raise EldomAuthError(f"Session rejected for {url}")
+        return res
+
+    @staticmethod
+    def _is_rejected(url: URL, status: int, _: bytes) -> bool:
+        return status == 401 or url.path.startswith(login_path)
+
+    async def _relogin(self, generation: int) -> None:
+        async with self._login_lock:
+            if generation != self._login_generation:
+                # someone else already logged in while we were waiting
+                return
+            if not await self.login(*self._credentials):
+                raise EldomAuthError("Login failed")
+
+    def _auth_cookie(self) -> Optional[str]:
+        for cookie in self._session.cookie_jar:
+            if cookie.key == auth_cookie_name:
+                return cookie.value
+        return None
+
+    def export_session(self) -> dict[str, str]:
+        """Cookies of the authenticated session, to be restored later"""
+        return {cookie.key: cookie.value for cookie in self._session.cookie_jar}
+
+    def restore_session(
+        self, user: str, password: str, cookies: Optional[dict[str, str]]
+    ) -> bool:
+        """
+        Reuse a saved session. The credentials are used to login again
+        if the cloud rejects it. Returns False if there is no session to reuse.
+        """
+        self._credentials = (user, password)
+        if not cookies or auth_cookie_name not in cookies:
+            return False
+        self._session.cookie_jar.update_cookies(cookies, URL(self._endpoint))
+        return True
+
+    async def login(self, user: str, password: str) -> bool:
+        self._credentials = (user, password)
+        self._session.cookie_jar.clear()
+        start = monotonic()
+
+        url, _, content = await self._send("GET", login_path, closes_breaker=False)
+
+        result = re.search(vtoken_pattern, str(content))
 
         if not result or not result.groupdict().get("token"):
             raise RuntimeError("Failed to start login procedure ...")
 
         token = result.groupdict().get("token")
 
-        login_data = urlencode(
-            {"Email": user, "Password": password, "__RequestVerificationToken": token}
-        )
+        login_data = {
+            "Email": user,
+            "Password": password,
+            login_request_token_name: token,
+        }
 
-        self._session.headers.update({"Referer": res.request.url})
+        self._headers["Referer"] = str(url)
 
-        res = self._session.post(
-            "/Account/Login",
-            data=login_data,
-            headers={
-                "Content-Type": "application/x-www-form-urlencoded",
-            },
+        url, status, _ = await self._send(
+            "POST", login_path, closes_breaker=False, data=login_data
         )
 
         # valid login should return cookie
-        auth_cookie = self._session.cookies.get(".AspNetCore.cookieath")
+        auth_cookie = self._auth_cookie()
 
-        self._session.headers.update(
-            {"Referer": res.headers.get("Location", res.request.url)}
-        )
-        next_res = self._session.get("/")
+        self._headers["Referer"] = str(url)
+        next_url, _, _ = await self._send("GET", "/", closes_breaker=False)
 
-        self._session.headers.update({"Referer": next_res.request.url})
+        self._headers["Referer"] = str(next_url)
 
-        return res.ok and auth_cookie is not None
+        success = status < 400 and auth_cookie is not None
+        self.metrics.record(LOGIN, monotonic() - start, 0, success)
+        if success:
+            self._login_generation += 1
+            if self.session_listener is not None:
+                self.session_listener(self.export_session())
+        return success
 
-    def get_user(self) -> User:
-        res = self._session.get("/api/user/get")
-        return data_utils.from_json(res.content, User)
+    async def get_user(self) -> User:
+        _, _, content = await self._request("GET", "/api/user/get")
+        return data_utils.from_json(content, User)
 
-    def get_devices(self):
-        res = self._session.get("/api/device/getmy")
-        return data_utils.from_json(res.content, list[Device])
+    async def get_devices(self, priority: int = PRIORITY_DEFAULT) -> list[Device]:
+        _, _, content = await self._request("GET", "/api/device/getmy", priority)
+        return data_utils.from_json(content, list[Device])
 
-    def get_device(self, id):
-        res = self._session.post(
-            "/api/device/getmydevice", json.dumps({"deviceId": id})
+    async def get_device(self, id) -> Device:
+        _, _, content = await self._request(
+            "POST", "/api/device/getmydevice", json={"deviceId": id}
         )
-        return data_utils.from_json(res.content, Device)
+        return data_utils.from_json(content, Device)
+
+    async def get_state(self, device: Device) -> DeviceState:
+        """
+        State of a device. Concurrent callers share one request and its result
+        is reused for state_cache_ttl seconds, until a command changes the device.
+        """
+        key = device.id
+        cached = self._state_cache.get(key)
+        if cached is not None and monotonic() - cached[0] < self.state_cache_ttl:
+            self.metrics.cache_hits += 1
+            return cached[1]
+        task = self._state_inflight.get(key)
+        if task is None:
+            self.metrics.cache_misses += 1
+            task = asyncio.ensure_future(self.fetch_state(device))
+            task.add_done_callback(partial(self._state_fetched, key))
+            self._state_inflight[key] = task
+        else:
+            self.metrics.cache_shared += 1
+        # a cancelled caller does not cancel the request of the others
+        return await asyncio.shield(task)
+
+    async def fetch_state(self, device: Device) -> DeviceState:
+        """State of a device from the cloud, not cached or shared with other callers"""
+        _, _, content = await self._request(
+            "GET", f"/api/flatboiler/{device.id}", PRIORITY_POLL
+        )
+        return self._decode_state(content)
 
-    def get_state(self, device: Device):
-        res = self._session.get(f"/api/flatboiler/{device.id}")
-        return data_utils.from_json(json.loads(res.content)["objectJson"], DeviceState)
+    def _state_fetched(self, key: int, task: asyncio.Task[DeviceState]) -> None:
+        if task.cancelled():
+            error = None
+        else:
+            # retrieved here in case every caller is gone
+            error = task.exception()
+        if self._state_inflight.get(key) is not task:
+            # invalidated by a command while in flight
+            return
+        del self._state_inflight[key]
+        if not task.cancelled() and error is None:
+            self._state_cache[key] = (monotonic(), task.result())
+
+    def invalidate_state(self, device: Device) -> None:
+        """Forget the cached and in flight state of a device"""
+        self._state_cache.pop(device.id, None)
+        self._state_inflight.pop(device.id, None)
+
+    async def supports_long_poll(self, device: Device) -> bool:
+        """
+        Whether the endpoint has the long poll wait_state uses, asked once with
+        a poll that returns at once. The Eldom cloud does not have it so far,
+        only the emulator.
+        """
+        async with self._long_poll_lock:
+            if self._long_poll is None:
+                try:
+                    await self.wait_state(device, None, 0)
+                    self._long_poll = True
+                except (EldomUnsupportedError, KeyError, ValueError):
+                    # not found, or a page that is not a state
+                    self._long_poll = False
+            return self._long_poll
+
+    async def wait_state(
+        self, device: Device, since: Optional[datetime.datetime], timeout: float
+    ) -> DeviceState:
+        """
+        Long poll for a state refreshed after since, returns the current state
+        when nothing changed within timeout seconds. Check supports_long_poll
+        first.
+        """
+        params = {"timeout": str(int(timeout))}
+        if since is not None:
+            params["since"] = str(since)
+        _, status, content = await self._request(
+            "GET",
+            f"/api/flatboiler/{device.id}/wait",
+            PRIORITY_POLL,
+            params=params,
+            timeout=ClientTimeout(total=timeout + 15),
+        )
+        if status == 404:
+            raise EldomUnsupportedError("Long polling is not supported by the endpoint")
+        return self._decode_state(content)
 
-    def set_temperature(self, device: Device, temperature: int):
+    @staticmethod
+    def _decode_state(content: bytes) -> DeviceState:
+        text = content.decode()
+        match = object_json_pattern.search(text)
+        if match is None:
+            # objectJson is a plain object, the response is parsed once
+            return data_utils.from_dict(json.loads(text)["objectJson"], DeviceState)
+        # the state is a JSON document embedded as a string, only that string is
+        # unescaped instead of parsing the whole response first
+        state, _ = scanstring(text, match.end())
+        return data_utils.from_json(state, DeviceState)
+
+    async def set_temperature(self, device: Device, temperature: int):
         """set temperature 35-75"""
         if temperature < 35:
             raise ValueError(f"temperature is too low (<35):{temperature}")
         if temperature > 75:
             raise ValueError(f"temperature is too high (>75):{temperature}")
 
-        res = self._session.post(
+        _, _, content = await self._request(
+            "POST",
             "/api/flatboiler/setTemperature",
-            data=json.dumps(
-                {"deviceId": device.real_device_id, "temperature": temperature}
-            ),
-            headers={
-                "Content-Type": "application/json",
-            },
+            PRIORITY_COMMAND,
+            json={"deviceId": device.real_device_id, "temperature": temperature},
         )
-        self._ensure_success(res, f"Failed to set temperature to {temperature}!")
+        self._ensure_success(content, f"Failed to set temperature to {temperature}!")
+        self.invalidate_state(device)
 
-    def set_power_boost(self, device: Device, boost: bool):
-        res = self._session.post(
+    async def set_power_boost(self, device: Device, boost: bool):
+        _, _, content = await self._request(
+            "POST",
             "/api/flatboiler/setHeater",
-            data=json.dumps({"deviceId": device.real_device_id, "heater": boost}),
-            headers={
-                "Content-Type": "application/json",
-            },
+            PRIORITY_COMMAND,
+            json={"deviceId": device.real_device_id, "heater": boost},
         )
-        self._ensure_success(res, f"Failed to set power boost to {boost}!")
+        self._ensure_success(content, f"Failed to set power boost to {boost}!")
+        self.invalidate_state(device)
 
-    def set_state(self, device: Device, state: Mode):
-        res = self._session.post(
+    async def set_state(self, device: Device, state: Mode):
+        _, _, content = await self._request(
+            "POST",
             "/api/flatboiler/setState",
-            data=json.dumps({"deviceId": device.real_device_id, "state": state.value}),
-            headers={
-                "Content-Type": "application/json",
-            },
+            PRIORITY_COMMAND,
+            json={"deviceId": device.real_device_id, "state": state.value},
         )
-        self._ensure_success(res, f"Failed to set state to {state.name}!")
+        self._ensure_success(content, f"Failed to set state to {state.name}!")
+        self.invalidate_state(device)
 
-    def _ensure_success(self, res: Response, message: str):
-        content = json.loads(res.content)
+    def _ensure_success(self, content: bytes, message: str):
+        content = json.loads(content)
         if content["status"] is not True:
             status = content["statusMessage"]
             error = f"{message}{status if status is not None else ''}"
@@ -1,6 +1,7 @@
 """Support for smartlife sensors."""
 from __future__ import annotations
 
+from collections.abc import Iterable
 from dataclasses import dataclass
 
 from homeassistant.components.binary_sensor import (
@@ -9,12 +10,13 @@ from homeassistant.components.binary_sensor import (
     BinarySensorEntityDescription,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from . import HomeAssistantEldomData
 from .api import DeviceType
-from .const import BOOST, DOMAIN, LOGGER
+from .const import BOOST, DOMAIN, LOGGER, SIGNAL_DEVICES_ADDED
 from .coordinator import EldomCoordinator
 from .entity import EldomBaseEntity
 
@@ -52,12 +54,14 @@ async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
 ) -> None:
     hass_data: HomeAssistantEldomData = hass.data[DOMAIN][entry.entry_id]
-    entities = []
 
-    for id, device in hass_data.devices.items():
-        if descriptions := SENSORS.get(device.device_type):
+    @callback
+    def _async_add_devices(ids: Iterable[str]) -> None:
+        entities = []
+        for id in ids:
+            device = hass_data.devices[id]
             coordinator = hass_data.coordinators[id]
-            for description in descriptions:
+            for description in SENSORS.get(device.device_type, ()):
                 LOGGER.debug(
                     "creating sensor %s for %s:%s",
                     description.name,
@@ -65,8 +69,14 @@ async def async_setup_entry(
                     device.display_name,
                 )
                 entities.append(EldomBinarySensorEntity(coordinator, description))
+        async_add_entities(entities)
 
-    async_add_entities(entities)
+    _async_add_devices(hass_data.devices)
+    entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_DEVICES_ADDED.format(entry.entry_id), _async_add_devices
+        )
+    )
 
 
 class EldomBinarySensorEntity(EldomBaseEntity, BinarySensorEntity):
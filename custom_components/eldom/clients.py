@@ -0,0 +1,78 @@
+"""Cloud clients shared by the config entries of the same account."""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+
+from aiohttp import CookieJar
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
+
+from .api import EldomAPI
+from .const import DATA_CLIENTS, DOMAIN, LOGGER
+
+
+@dataclass
+class SharedClient:
+    """The client of an account and the config entries using it."""
+
+    api: EldomAPI
+    entries: list[str] = field(default_factory=list)
+    password: str | None = None
+    """password the session was logged in or restored with, None before that"""
+    login_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    """held by an entry logging in, the others wait for its session"""
+
+    def is_owner(self, entry_id: str) -> bool:
+        """
+        Whether the entry shows the account wide metrics and imports the energy
+        statistics. Another entry of the account takes over at its next setup.
+        """
+        return bool(self.entries) and self.entries[0] == entry_id
+
+
+@callback
+def async_acquire_client(
+    hass: HomeAssistant, endpoint: str, username: str, entry_id: str
+) -> SharedClient:
+    """Return the client of an account and take a reference to it."""
+    clients: dict[tuple[str, str], SharedClient] = hass.data.setdefault(
+        DOMAIN, {}
+    ).setdefault(DATA_CLIENTS, {})
+    key = (endpoint, username)
+    if key not in clients:
+        # closed with the last reference, not with the first entry unloaded,
+        # the unsafe jar keeps the cookies of IP endpoints like the emulator
+        session = async_create_clientsession(
+            hass, auto_cleanup=False, cookie_jar=CookieJar(unsafe=True)
+        )
+        clients[key] = SharedClient(EldomAPI(endpoint, session))
+    client = clients[key]
+    if entry_id not in client.entries:
+        client.entries.append(entry_id)
+    LOGGER.debug("client %s@%s has %s users", username, endpoint, len(client.entries))
+    return client
+
+
+async def async_release_client(
+    hass: HomeAssistant, endpoint: str, username: str, entry_id: str
+) -> None:
+    """Drop a reference to an account client, closing it with the last one."""
+    clients: dict[tuple[str, str], SharedClient] = hass.data.get(DOMAIN, {}).get(
+        DATA_CLIENTS, {}
+    )
+    key = (endpoint, username)
+    if (client := clients.get(key)) is None or entry_id not in client.entries:
+        return
+    client.entries.remove(entry_id)
+    if client.entries:
+        return
+
+    del clients[key]
+    if not clients:
+        hass.data[DOMAIN].pop(DATA_CLIENTS)
+    if client.api.tracer is not None:
+        await hass.async_add_executor_job(client.api.tracer.close)
+        client.api.tracer = None
+    await client.api._session.close()
+    LOGGER.debug("client %s@%s closed", username, endpoint)
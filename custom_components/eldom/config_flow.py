@@ -2,18 +2,61 @@
 from __future__ import annotations
 
 from typing import Any
+from aiohttp import CookieJar
 import voluptuous as vol
 from homeassistant import config_entries
+from homeassistant.core import callback
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from homeassistant.helpers.selector import TimeSelector
 
-from .api import EldomAPI
-from .const import CONF_ENDPOINT, CONF_PASSWORD, CONF_USERNAME, DOMAIN, LOGGER
+from .api import EldomAPI, EldomAuthError, EldomUnavailableError
+from .const import (
+    CONF_DEVICE,
+    CONF_DEVICES,
+    CONF_ENDPOINT,
+    CONF_ENERGY_STATISTICS,
+    CONF_MAX_CONCURRENT,
+    CONF_PASSWORD,
+    CONF_POLL_INTERVAL,
+    CONF_POLL_INTERVAL_FAST,
+    CONF_POLL_INTERVAL_OFF,
+    CONF_POLL_INTERVAL_QUIET,
+    CONF_POLL_MODE,
+    CONF_QUIET_END,
+    CONF_QUIET_START,
+    CONF_TRACE,
+    CONF_TRANSPORT,
+    CONF_USERNAME,
+    DEFAULT_FAST_POLL,
+    DEFAULT_MAX_CONCURRENT,
+    DEFAULT_NORMAL_POLL,
+    DEFAULT_POLL_MODE,
+    DEFAULT_QUIET_END,
+    DEFAULT_QUIET_START,
+    DEFAULT_TRANSPORT,
+    DOMAIN,
+    LOGGER,
+    POLL_MODE_ACCOUNT,
+    POLL_MODE_CONDITIONAL,
+    POLL_MODE_DEVICE,
+)
+from .store import async_get_session_store
+from .transport import TRANSPORT_LONG_POLL, TRANSPORT_POLLING
 
 
 class EldomConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Tuya Config Flow."""
 
     @staticmethod
-    def _try_login(user_input: dict[str, Any]) -> tuple[dict[Any, Any], dict[str, Any]]:
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> EldomOptionsFlow:
+        return EldomOptionsFlow(config_entry)
+
+    async def _try_login(
+        self, user_input: dict[str, Any]
+    ) -> tuple[dict[Any, Any], dict[str, Any]]:
         """Try login."""
         response = {}
 
@@ -23,12 +66,23 @@ class EldomConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             CONF_PASSWORD: user_input[CONF_PASSWORD],
         }
 
-        api = EldomAPI(data[CONF_ENDPOINT])
+        session = async_create_clientsession(
+            self.hass, auto_cleanup=False, cookie_jar=CookieJar(unsafe=True)
+        )
+        api = EldomAPI(data[CONF_ENDPOINT], session)
         result = False
         try:
-            result = api.login(data[CONF_USERNAME], data[CONF_PASSWORD])
+            result = await api.login(data[CONF_USERNAME], data[CONF_PASSWORD])
+            if result:
+                # hand the authenticated session over to the entry setup
+                store = await async_get_session_store(self.hass)
+                store.async_set(
+                    data[CONF_ENDPOINT], data[CONF_USERNAME], api.export_session()
+                )
         except Exception as e:
             response["error"] = str(e)
+        finally:
+            await session.close()
         response["result"] = result
         return response, data
 
@@ -38,9 +92,7 @@ class EldomConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         placeholders = {}
 
         if user_input is not None:
-            response, data = await self.hass.async_add_executor_job(
-                self._try_login, user_input
-            )
+            response, data = await self._try_login(user_input)
 
             if response.get("result", False):
                 return self.async_create_entry(
@@ -72,3 +124,165 @@ class EldomConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=errors,
             description_placeholders=placeholders,
         )
+
+    async def async_step_reauth(self, entry_data):
+        """The saved password was rejected."""
+        return await self.async_step_reauth_confirm()
+
+    async def async_step_reauth_confirm(self, user_input=None):
+        """Ask for the password again."""
+        entry = self._get_reauth_entry()
+        errors = {}
+        placeholders = {"username": entry.data[CONF_USERNAME], "msg": ""}
+
+        if user_input is not None:
+            response, data = await self._try_login(
+                {**entry.data, CONF_PASSWORD: user_input[CONF_PASSWORD]}
+            )
+            if response.get("result", False):
+                return self.async_update_reload_and_abort(entry, data=data)
+            errors["base"] = "login_error"
+            placeholders["msg"] = response.get("error", "?")
+
+        return self.async_show_form(
+            step_id="reauth_confirm",
+            data_schema=vol.Schema({vol.Required(CONF_PASSWORD): str}),
+            errors=errors,
+            description_placeholders=placeholders,
+        )
+
+
+def _interval(minimum: int, maximum: int) -> vol.All:
+    return vol.All(vol.Coerce(int), vol.Range(min=minimum, max=maximum))
+
+
+class EldomOptionsFlow(config_entries.OptionsFlow):
+    """Account settings and per device poll schedules."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        self._entry = config_entry
+        self._device_id: str | None = None
+        self._device_name: str | None = None
+
+    async def async_step_init(self, user_input=None):
+        return self.async_show_menu(step_id="init", menu_options=["account", "device"])
+
+    async def _async_supports_long_poll(self) -> bool:
+        hass_data = self.hass.data.get(DOMAIN, {}).get(self._entry.entry_id)
+        if hass_data is None or not hass_data.devices:
+            return False
+        try:
+            return await hass_data.api.supports_long_poll(
+                next(iter(hass_data.devices.values()))
+            )
+        except (EldomAuthError, EldomUnavailableError):
+            return False
+
+    async def async_step_account(self, user_input=None):
+        """Settings of the whole account, changing them reloads the entry."""
+        options = self._entry.options
+        if user_input is not None:
+            return self.async_create_entry(title="", data={**options, **user_input})
+
+        # long polling is offered only where the endpoint has it
+        transports = [TRANSPORT_POLLING]
+        if await self._async_supports_long_poll():
+            transports.append(TRANSPORT_LONG_POLL)
+        transport = options.get(CONF_TRANSPORT, DEFAULT_TRANSPORT)
+        if transport not in transports:
+            transport = TRANSPORT_POLLING
+
+        return self.async_show_form(
+            step_id="account",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_POLL_MODE,
+                        default=options.get(CONF_POLL_MODE, DEFAULT_POLL_MODE),
+                    ): vol.In(
+                        [POLL_MODE_DEVICE, POLL_MODE_ACCOUNT, POLL_MODE_CONDITIONAL]
+                    ),
+                    vol.Required(CONF_TRANSPORT, default=transport): vol.In(
+                        transports
+                    ),
+                    vol.Required(
+                        CONF_MAX_CONCURRENT,
+                        default=options.get(
+                            CONF_MAX_CONCURRENT, DEFAULT_MAX_CONCURRENT
+                        ),
+                    ): _interval(1, 16),
+                    vol.Required(
+                        CONF_TRACE, default=options.get(CONF_TRACE, False)
+                    ): bool,
+                    vol.Required(
+                        CONF_ENERGY_STATISTICS,
+                        default=options.get(CONF_ENERGY_STATISTICS, True),
+                    ): bool,
+                }
+            ),
+        )
+
+    async def async_step_device(self, user_input=None):
+        """Pick the device to schedule."""
+        hass_data = self.hass.data.get(DOMAIN, {}).get(self._entry.entry_id)
+        if hass_data is None or not hass_data.devices:
+            return self.async_abort(reason="no_devices")
+        if user_input is not None:
+            self._device_id = user_input[CONF_DEVICE]
+            self._device_name = hass_data.devices[self._device_id].display_name
+            return await self.async_step_schedule()
+
+        return self.async_show_form(
+            step_id="device",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_DEVICE): vol.In(
+                        {id: d.display_name for id, d in hass_data.devices.items()}
+                    ),
+                }
+            ),
+        )
+
+    async def async_step_schedule(self, user_input=None):
+        """Poll intervals and quiet hours of a device, applied without a reload."""
+        devices = self._entry.options.get(CONF_DEVICES, {})
+        if user_input is not None:
+            devices = {**devices, self._device_id: user_input}
+            return self.async_create_entry(
+                title="", data={**self._entry.options, CONF_DEVICES: devices}
+            )
+
+        current = devices.get(self._device_id, {})
+        # the off and quiet intervals default to the normal one, like at runtime
+        normal = current.get(CONF_POLL_INTERVAL, DEFAULT_NORMAL_POLL)
+        return self.async_show_form(
+            step_id="schedule",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_POLL_INTERVAL, default=normal): _interval(
+                        10, 3600
+                    ),
+                    vol.Required(
+                        CONF_POLL_INTERVAL_FAST,
+                        default=current.get(CONF_POLL_INTERVAL_FAST, DEFAULT_FAST_POLL),
+                    ): _interval(1, 60),
+                    vol.Required(
+                        CONF_POLL_INTERVAL_OFF,
+                        default=current.get(CONF_POLL_INTERVAL_OFF, normal),
+                    ): _interval(10, 86400),
+                    vol.Required(
+                        CONF_QUIET_START,
+                        default=current.get(CONF_QUIET_START, DEFAULT_QUIET_START),
+                    ): TimeSelector(),
+                    vol.Required(
+                        CONF_QUIET_END,
+                        default=current.get(CONF_QUIET_END, DEFAULT_QUIET_END),
+                    ): TimeSelector(),
+                    vol.Required(
+                        CONF_POLL_INTERVAL_QUIET,
+                        default=current.get(CONF_POLL_INTERVAL_QUIET, normal),
+                    ): _interval(10, 86400),
+                }
+            ),
+            description_placeholders={"device": self._device_name},
+        )
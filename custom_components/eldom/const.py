@@ -1,6 +1,7 @@
 """Constants for the Tuya integration."""
 from __future__ import annotations
 
+from datetime import timedelta
 import logging
 
 from homeassistant.const import Platform
@@ -13,9 +14,47 @@ CONF_USERNAME = "username"
 CONF_PASSWORD = "password"
 CONF_POLL_INTERVAL: str = "poll_interval"
 CONF_POLL_INTERVAL_FAST: str = "poll_interval_fast"
+CONF_POLL_INTERVAL_OFF: str = "poll_interval_off"
+CONF_POLL_INTERVAL_QUIET: str = "poll_interval_quiet"
+CONF_QUIET_START: str = "quiet_start"
+CONF_QUIET_END: str = "quiet_end"
+CONF_TRANSPORT: str = "transport"
+CONF_DEVICES: str = "devices"
+CONF_DEVICE: str = "device"
+CONF_POLL_MODE: str = "poll_mode"
+CONF_MAX_CONCURRENT: str = "max_concurrent"
+CONF_TRACE: str = "trace"
+CONF_ENERGY_STATISTICS: str = "energy_statistics"
+
+# hass.data[DOMAIN] key of the clients shared by entries of the same account
+DATA_CLIENTS = "clients"
+
+POLL_MODE_DEVICE = "device"
+POLL_MODE_ACCOUNT = "account"
+# account cycle fetching only the states the device list shows as refreshed
+POLL_MODE_CONDITIONAL = "conditional"
 
 DEFAULT_FAST_POLL = 3
 DEFAULT_NORMAL_POLL = 60
+# quiet hours are disabled when they start and end at the same time
+DEFAULT_QUIET_START = "00:00:00"
+DEFAULT_QUIET_END = "00:00:00"
+DEFAULT_POLL_MODE = POLL_MODE_DEVICE
+DEFAULT_TRANSPORT = "polling"
+DEFAULT_MAX_CONCURRENT = 4
+# fast polls after a command back off until the device confirms the change
+FAST_POLL_BACKOFF = 1.5
+COMMAND_CONFIRM_TIMEOUT = 60
+# commands of the same kind within this window are sent once, with the last value
+COMMAND_DEBOUNCE = 0.5
+# request trace file in the config directory, {} is the config entry id
+TRACE_FILE = "eldom_trace_{}.jsonl"
+# how often the devices of the account are checked for additions and removals
+DEVICE_DISCOVERY_INTERVAL = timedelta(hours=1)
+# dispatched with the ids of newly discovered devices, {} is the config entry id
+SIGNAL_DEVICES_ADDED = "eldom_devices_added_{}"
+# how long setup waits for the first device states before adding entities
+STARTUP_STATE_TIMEOUT = 10
 
 BOOST = "Powerfull"
 
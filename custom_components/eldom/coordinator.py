@@ -1,17 +1,47 @@
+import asyncio
+from dataclasses import fields, replace
 import datetime as dt
 from enum import StrEnum
+from time import monotonic, time
+from typing import Any, Optional
 
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryAuthFailed, HomeAssistantError
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 
-from .api import Device, DeviceState, EldomAPI, Mode
+from .api import (
+    Device,
+    DeviceState,
+    EldomAPI,
+    EldomAuthError,
+    EldomUnavailableError,
+    Mode,
+)
 from .const import (
+    CONF_MAX_CONCURRENT,
     CONF_POLL_INTERVAL,
     CONF_POLL_INTERVAL_FAST,
+    CONF_POLL_INTERVAL_OFF,
+    CONF_POLL_INTERVAL_QUIET,
+    CONF_POLL_MODE,
+    CONF_QUIET_END,
+    CONF_QUIET_START,
+    CONF_TRANSPORT,
+    COMMAND_CONFIRM_TIMEOUT,
+    COMMAND_DEBOUNCE,
     DEFAULT_FAST_POLL,
+    DEFAULT_MAX_CONCURRENT,
     DEFAULT_NORMAL_POLL,
+    DEFAULT_TRANSPORT,
+    FAST_POLL_BACKOFF,
     LOGGER,
+    POLL_MODE_CONDITIONAL,
 )
+from .metrics import PollClock
+from .scheduler import PRIORITY_POLL
+from .telemetry import HeatUpEstimator, TelemetryBuffer
+from .transport import create_transport
 
 
 class SetState(StrEnum):
@@ -25,28 +55,198 @@ class SetState(StrEnum):
     """power boost"""
 
 
+STATE_FIELDS = tuple(f.name for f in fields(DeviceState))
+
+TELEMETRY_FIELD = "telemetry"
+"""pseudo field reported as changed when a telemetry sample was added"""
+
+
+class EldomAccountCoordinator(DataUpdateCoordinator[dict[str, DeviceState]]):
+    """Polls the state of every device of the account in one concurrent cycle."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        api: EldomAPI,
+        devices: dict[str, Device],
+        coordinators: dict[str, "EldomCoordinator"],
+        conf: dict,
+    ):
+        self._api = api
+        self.devices = devices
+        self.coordinators = coordinators
+        self._normal_poll_interval = int(
+            conf.get(CONF_POLL_INTERVAL, DEFAULT_NORMAL_POLL)
+        )
+        # devices polled in the last cycle, the others were not due
+        self.polled: frozenset[str] = frozenset()
+        # fetch the state only of devices the device list shows as refreshed
+        self._conditional = conf.get(CONF_POLL_MODE) == POLL_MODE_CONDITIONAL
+        self._refresh_dates: dict[str, Any] = {}
+        self._semaphore = asyncio.Semaphore(
+            int(conf.get(CONF_MAX_CONCURRENT, DEFAULT_MAX_CONCURRENT))
+        )
+        self._poll_clock = PollClock()
+        # devices whose last poll failed
+        self._failing: set[str] = set()
+
+        super().__init__(
+            hass,
+            LOGGER,
+            name="Eldom:account",
+            update_interval=dt.timedelta(seconds=self._normal_poll_interval),
+            update_method=self.async_update,
+        )
+        self.data = {}
+
+    def _due(self) -> list[str]:
+        """ids of the devices whose poll interval has passed"""
+        now = monotonic()
+        # a device is due in the cycle closest to its next poll
+        slack = self.update_interval.total_seconds() / 2
+        return [
+            id
+            for id in self.devices
+            if (c := self.coordinators.get(id)) is None or c.poll_due(now, slack)
+        ]
+
+    def _tick(self) -> dt.timedelta:
+        """the shortest device interval, devices not due in a cycle are skipped"""
+        return dt.timedelta(
+            seconds=min(
+                (c.poll_interval() for c in self.coordinators.values()),
+                default=self._normal_poll_interval,
+            )
+        )
+
+    @callback
+    def async_reschedule(self) -> None:
+        """apply changed device schedules now instead of after the next cycle"""
+        self.update_interval = self._tick()
+        self._schedule_refresh()
+
+    async def _get_state(self, device: Device) -> DeviceState:
+        async with self._semaphore:
+            return await self._api.get_state(device)
+
+    async def _refreshed(self, ids: list[str]) -> tuple[list[str], dict[str, Any]]:
+        """
+        ids whose refresh date in the device list moved since their last poll,
+        and the refresh dates of the list
+        """
+        try:
+            devices = await self._api.get_devices(PRIORITY_POLL)
+        except (EldomAuthError, EldomUnavailableError) as e:
+            LOGGER.debug("device list failed, polling every device: %s", e)
+            return ids, {}
+        dates = {d.real_device_id: d.last_data_refresh_date for d in devices}
+        return [
+            id
+            for id in ids
+            if dates.get(id) is None
+            or id not in self._refresh_dates
+            or dates[id] != self._refresh_dates[id]
+        ], dates
+
+    async def async_update(self) -> dict[str, DeviceState]:
+        start, jitter = self._poll_clock.start(
+            self.update_interval.total_seconds() if self.update_interval else None
+        )
+        ok = False
+        try:
+            data = await self._async_poll()
+            ok = True
+            return data
+        finally:
+            self._api.metrics.record_poll(monotonic() - start, jitter, ok)
+
+    async def _async_poll(self) -> dict[str, DeviceState]:
+        ids = self._due()
+        dates = {}
+        if self._conditional and ids:
+            ids, dates = await self._refreshed(ids)
+        self.polled = frozenset(ids)
+        self.update_interval = self._tick()
+        results = await asyncio.gather(
+            *(self._get_state(self.devices[id]) for id in ids), return_exceptions=True
+        )
+
+        data = {}
+        for id, result in zip(ids, results):
+            if isinstance(result, Exception):
+                # warned once when a device starts failing, not on every cycle
+                if id in self._failing:
+                    LOGGER.debug("Failed to get state of %s: %s", id, result)
+                else:
+                    LOGGER.warning("Failed to get state of %s: %s", id, result)
+                    self._failing.add(id)
+            else:
+                if id in self._failing:
+                    LOGGER.info("Got the state of %s again", id)
+                    self._failing.discard(id)
+                data[id] = result
+                if id in dates:
+                    self._refresh_dates[id] = dates[id]
+
+        if ids and not data:
+            if all(isinstance(result, EldomAuthError) for result in results):
+                raise ConfigEntryAuthFailed(str(results[0]))
+            raise UpdateFailed(f"Failed to get state of all {len(ids)} devices")
+        return data
+
+
 class EldomCoordinator(DataUpdateCoordinator[DeviceState]):
-    _fast_poll_count = 0
     _initialized = False
 
+    changed_fields: Optional[frozenset[str]] = None
+    """fields changed by the last update, None when every entity should update"""
+
+    suppressed_updates = 0
+    """entity state writes skipped because nothing they show has changed"""
+
+    stale_since: Optional[dt.datetime] = None
+    """set while the cloud is unavailable and the last known state is served"""
+
+    restored = False
+    """the state was restored from storage and not polled yet"""
+
     def __init__(
         self,
         hass: HomeAssistant,
         api: EldomAPI,
         id: str,
         device: Device,
-        state: DeviceState,
+        state: Optional[DeviceState],
         conf: dict,
+        account: Optional[EldomAccountCoordinator] = None,
     ):
         self.id = id
         self._api = api
         self.device = device
-
-        self._normal_poll_interval = int(
-            conf.get(CONF_POLL_INTERVAL, DEFAULT_NORMAL_POLL)
-        )
-        self._fast_poll_interval = int(
-            conf.get(CONF_POLL_INTERVAL_FAST, DEFAULT_FAST_POLL)
+        self._account = account
+        self._unsub_account = None
+        self._poll_clock = PollClock()
+        # recent polled samples for the derived sensors
+        self.telemetry = TelemetryBuffer()
+        self.heat_up = HeatUpEstimator()
+        # last state reported by the cloud, data is this plus pending commands
+        self._polled = state
+        self.restored = state is not None
+        # state fields the device should report after the last commands
+        self._expected: dict[str, Any] = {}
+        self._expected_deadline = 0.0
+        self.last_command_failure: Optional[str] = None
+        # commands waiting for the debounce window, the last value of each kind
+        self._commands: dict[SetState, tuple[Any, asyncio.Future[bool]]] = {}
+        self._commands_timer: Optional[asyncio.TimerHandle] = None
+        self._write_lock = asyncio.Lock()
+        # write tasks, flushed batches waiting for the lock or being written
+        self._write_tasks: set[asyncio.Task] = set()
+        # when the account coordinator should poll the device next
+        self._next_poll: Optional[float] = None
+        self.set_schedule(conf, refresh=False)
+        self.transport = create_transport(
+            conf.get(CONF_TRANSPORT, DEFAULT_TRANSPORT), api, device
         )
 
         """Initialize coordinator parent"""
@@ -54,30 +254,271 @@ class EldomCoordinator(DataUpdateCoordinator[DeviceState]):
             hass,
             LOGGER,
             name=f"Eldom:{self.device.display_name}",
-            update_interval=dt.timedelta(seconds=self._fast_poll_interval),
+            update_interval=self._normal_update_interval(),
             update_method=self.async_update,
         )
         self.data = state
 
+        if account is not None:
+            self._unsub_account = account.async_add_listener(self._handle_account_update)
+
+    def set_schedule(self, conf: dict, refresh: bool = True) -> None:
+        """Apply poll intervals and quiet hours, live unless refresh is False"""
+        self._normal_poll_interval = int(
+            conf.get(CONF_POLL_INTERVAL, DEFAULT_NORMAL_POLL)
+        )
+        self._fast_poll_interval = int(
+            conf.get(CONF_POLL_INTERVAL_FAST, DEFAULT_FAST_POLL)
+        )
+        self._off_poll_interval = int(
+            conf.get(CONF_POLL_INTERVAL_OFF, self._normal_poll_interval)
+        )
+        self._quiet_poll_interval = int(
+            conf.get(CONF_POLL_INTERVAL_QUIET, self._normal_poll_interval)
+        )
+        self._quiet_hours = None
+        start = conf.get(CONF_QUIET_START)
+        end = conf.get(CONF_QUIET_END)
+        if start and end and start != end:
+            self._quiet_hours = (
+                dt.time.fromisoformat(start),
+                dt.time.fromisoformat(end),
+            )
+        self._next_poll = None
+        if refresh and not self._expected:
+            self._set_poll_mode(fast=False)
+
+    def _in_quiet_hours(self) -> bool:
+        if self._quiet_hours is None:
+            return False
+        start, end = self._quiet_hours
+        now = dt_util.now().time()
+        if start < end:
+            return start <= now < end
+        # the quiet hours span midnight
+        return now >= start or now < end
+
+    def poll_interval(self) -> int:
+        """seconds between polls right now, slower in quiet hours or when off"""
+        interval = self._normal_poll_interval
+        if self._polled is not None and self._polled.state == Mode.OFF:
+            interval = max(interval, self._off_poll_interval)
+        if self._in_quiet_hours():
+            interval = max(interval, self._quiet_poll_interval)
+        return interval
+
+    def poll_due(self, now: float, slack: float = 0) -> bool:
+        """whether the account coordinator should poll the device in this cycle"""
+        if self.transport.connected:
+            return False
+        return self._next_poll is None or now + slack >= self._next_poll
+
+    @callback
+    def start_transport(self) -> None:
+        self.transport.start(
+            self._handle_pushed,
+            self._handle_connection,
+            self.hass.async_create_background_task,
+        )
+
+    @callback
+    def _handle_pushed(self, state: DeviceState) -> None:
+        self.async_set_updated_data(self._apply_polled(state))
+
+    @callback
+    def _handle_connection(self, connected: bool) -> None:
+        # polling pauses while states are pushed and resumes when disconnected
+        LOGGER.debug("%s push %s", self.name, "connected" if connected else "lost")
+        self._set_poll_mode(fast=bool(self._expected))
+
+    @callback
+    def _handle_account_update(self) -> None:
+        if self._account.last_update_success and self.id not in self._account.polled:
+            # not due or not refreshed in this cycle
+            return
+        if self._account.last_update_success and (
+            state := self._account.data.get(self.id)
+        ):
+            self.async_set_updated_data(self._apply_polled(state))
+        elif self._polled is not None:
+            self.data = self._serve_stale(self._account.last_exception)
+            self.async_update_listeners()
+        else:
+            self.async_set_update_error(
+                UpdateFailed(f"No state for {self.id} in the account poll")
+            )
+
+    def _normal_update_interval(self) -> Optional[dt.timedelta]:
+        if self.transport.connected:
+            # the states are pushed
+            return None
+        if self._account is not None:
+            # the account coordinator polls this device when it is due
+            return None
+        return dt.timedelta(seconds=self.poll_interval())
+
     def _set_poll_mode(self, fast: bool):
-        self._fast_poll_count = 0 if fast else -1
-        interval = self._fast_poll_interval if fast else self._normal_poll_interval
-        self.update_interval = dt.timedelta(seconds=interval)
+        if fast and not self.transport.connected:
+            self.update_interval = dt.timedelta(seconds=self._fast_poll_interval)
+        else:
+            self.update_interval = self._normal_update_interval()
         self._schedule_refresh()
 
-    def _update_poll(self):
-        if self._fast_poll_count > -1:
-            self._fast_poll_count += 1
-            if self._fast_poll_count > 5:
-                self._set_poll_mode(fast=False)
+    @staticmethod
+    def _expected_fields(key: SetState, value) -> dict[str, Any]:
+        match key:
+            case SetState.TEMP:
+                return {"set_temp": int(value)}
+            case SetState.BOOST:
+                return {"has_boost": True}
+            case SetState.MODE:
+                return {"state": Mode(value)}
+        return {}
 
-    async def async_update(self):
-        self._update_poll()
+    def _apply_optimistic(self, key: SetState, value) -> None:
+        """Show the result of a command before the cloud confirms it"""
+        self._expected.update(self._expected_fields(key, value))
+        self._expected_deadline = monotonic() + COMMAND_CONFIRM_TIMEOUT
+        if self._polled is not None:
+            self.async_set_updated_data(self._publish())
+
+    def _rollback(self, key: SetState, value, reason: str) -> None:
+        expected = self._expected_fields(key, value)
+        for name, expected_value in expected.items():
+            if self._expected.get(name) == expected_value:
+                del self._expected[name]
+        self.last_command_failure = reason
+        LOGGER.warning("%s rolled back %s: %s", self.name, expected, reason)
+        if self._polled is not None:
+            self.async_set_updated_data(self._publish())
 
+    def _check_expected(self, state: DeviceState) -> None:
+        """Leave fast polling once the device reports what the commands set"""
+        if not self._expected:
+            return
+        pending = {
+            name: value
+            for name, value in self._expected.items()
+            if getattr(state, name) != value
+        }
+        if not pending:
+            LOGGER.debug("%s confirmed %s", self.name, self._expected)
+            self._expected = {}
+            self._set_poll_mode(fast=False)
+        elif monotonic() > self._expected_deadline:
+            # the polled state is published as is, which rolls the view back
+            self.last_command_failure = f"not applied: {pending}"
+            LOGGER.warning(
+                "%s rolled back %s: not applied within %ss",
+                self.name,
+                pending,
+                COMMAND_CONFIRM_TIMEOUT,
+            )
+            self._expected = {}
+            self._set_poll_mode(fast=False)
+        else:
+            self._expected = pending
+            if self.update_interval is not None:
+                # back off while waiting, but never poll slower than normal
+                self.update_interval = min(
+                    self.update_interval * FAST_POLL_BACKOFF,
+                    dt.timedelta(seconds=self._normal_poll_interval),
+                )
+
+    async def async_update(self):
         if not self._initialized:
             await self._initialize()
 
-        return await self.hass.async_add_executor_job(self._api.get_state, self.device)
+        start, jitter = self._poll_clock.start(
+            self.update_interval.total_seconds() if self.update_interval else None
+        )
+        try:
+            state = await self.transport.fetch()
+        except EldomUnavailableError as e:
+            self._api.metrics.record_poll(monotonic() - start, jitter, False)
+            if self._polled is None:
+                raise UpdateFailed(str(e)) from e
+            return self._serve_stale(e)
+        except EldomAuthError as e:
+            # starts a reauth, setup may not have asked the cloud when it
+            # restored the last known states
+            self._api.metrics.record_poll(monotonic() - start, jitter, False)
+            raise ConfigEntryAuthFailed(str(e)) from e
+        except (KeyError, TypeError, ValueError) as e:
+            # an error page or a changed document instead of the state
+            self._api.metrics.record_poll(monotonic() - start, jitter, False)
+            raise UpdateFailed(f"Unexpected state response: {e!r}") from e
+        self._api.metrics.record_poll(monotonic() - start, jitter, True)
+        return self._apply_polled(state)
+
+    def _serve_stale(self, err: Optional[Exception]) -> DeviceState:
+        """Keep the last known state while the cloud is unavailable"""
+        if self.stale_since is None:
+            LOGGER.info("%s serving the last known state: %s", self.name, err)
+            self.stale_since = dt_util.utcnow()
+            # every entity shows the stale flag
+            self.changed_fields = None
+        else:
+            self.changed_fields = frozenset()
+        return self.data
+
+    @property
+    def stale_age(self) -> Optional[float]:
+        """seconds since the state was last refreshed from the cloud"""
+        if self.stale_since is None:
+            return None
+        return (dt_util.utcnow() - self.stale_since).total_seconds()
+
+    def _apply_polled(self, state: DeviceState) -> DeviceState:
+        """Reconcile a polled state with pending commands, returns the state to keep"""
+        # leaving the stale or restored state shows on every entity
+        refresh_all = self.stale_since is not None or self.restored
+        self.stale_since = None
+        self.restored = False
+        old = self._polled
+        if (
+            old is not None
+            and state.date is not None
+            and state.date == old.date
+            and state.last_refresh_date == old.last_refresh_date
+        ):
+            # the cloud has not refreshed the payload since the last poll
+            state = old
+        sampled = state is not old
+        if sampled:
+            self.telemetry.append(monotonic(), state)
+            self.heat_up.update(time(), state)
+        self._polled = state
+        self._next_poll = monotonic() + self.poll_interval()
+        self._check_expected(state)
+        if not self._expected and self._account is None:
+            # entering quiet hours or turning off changes the interval
+            self.update_interval = self._normal_update_interval()
+        state = self._publish()
+        if refresh_all:
+            self.changed_fields = None
+        elif sampled and self.changed_fields is not None:
+            # derived values move with every sample, even if no field changed
+            self.changed_fields |= {TELEMETRY_FIELD}
+        return state
+
+    def _publish(self) -> DeviceState:
+        """Polled state with pending commands applied, records the changed fields"""
+        state = self._polled
+        if self._expected:
+            state = replace(state, **self._expected)
+        old = self.data
+        if old is None:
+            self.changed_fields = None
+        elif state is old:
+            self.changed_fields = frozenset()
+        else:
+            self.changed_fields = frozenset(
+                name
+                for name in STATE_FIELDS
+                if getattr(state, name) != getattr(old, name)
+            )
+        return state
 
     async def _initialize(self):
         pass
@@ -98,32 +539,93 @@ class EldomCoordinator(DataUpdateCoordinator[DeviceState]):
     def state(self) -> DeviceState:
         return self.data
 
+    @property
+    def polled_state(self) -> Optional[DeviceState]:
+        """last state reported by the cloud, without pending commands"""
+        return self._polled
+
     async def async_set_state(self, key: SetState, value) -> bool:
+        if key not in (SetState.TEMP, SetState.BOOST, SetState.MODE):
+            LOGGER.warning("async_set_state: invalid key %s - %s", key, value)
+            return False
+
+        if (queued := self._commands.get(key)) is not None:
+            # superseded callers get the result of the latest value
+            future = queued[1]
+        else:
+            future = self.hass.loop.create_future()
+        self._commands[key] = (value, future)
+        self._apply_optimistic(key, value)
+
+        if self._commands_timer is not None:
+            self._commands_timer.cancel()
+        self._commands_timer = self.hass.loop.call_later(
+            COMMAND_DEBOUNCE, self._flush_commands
+        )
+        return await asyncio.shield(future)
+
+    @callback
+    def _flush_commands(self) -> None:
+        self._commands_timer = None
+        task = self.hass.async_create_background_task(
+            self._async_write_commands(), f"{self.name} commands"
+        )
+        self._write_tasks.add(task)
+        task.add_done_callback(self._write_tasks.discard)
+
+    async def _async_write_commands(self) -> None:
+        # only one write in flight, commands queued meanwhile wait for the next
+        async with self._write_lock:
+            commands, self._commands = self._commands, {}
+            try:
+                for key, (value, future) in commands.items():
+                    try:
+                        await self._async_write(key, value)
+                    except Exception as e:
+                        self._rollback(key, value, f"command failed: {e}")
+                        # service calls report it as a failed action
+                        error = HomeAssistantError(
+                            f"Setting {key} of {self.device.name} failed: {e}"
+                        )
+                        error.__cause__ = e
+                        future.set_exception(error)
+                    else:
+                        future.set_result(True)
+            finally:
+                # cancelled by a shutdown, the callers of the rest must not hang
+                for _, future in commands.values():
+                    if not future.done():
+                        future.cancel()
+
+    async def _async_write(self, key: SetState, value) -> None:
         match key:
             case SetState.TEMP:
-                await self.hass.async_add_executor_job(
-                    self._api.set_temperature, self.device, int(value)
-                )
+                await self._api.set_temperature(self.device, int(value))
             case SetState.BOOST:
-                await self.hass.async_add_executor_job(
-                    self._api.set_power_boost, self.device, True
-                )
+                await self._api.set_power_boost(self.device, True)
             case SetState.MODE:
-                await self.hass.async_add_executor_job(
-                    self._api.set_state, self.device, Mode(value)
-                )
-            case _:
-                LOGGER.warning("async_set_state: invalid key %s - %s", key, value)
-                return False
-
-        # self.state[key] = value
+                await self._api.set_state(self.device, Mode(value))
 
         LOGGER.info("async_set_state: %s - %s", key, value)
 
-        # self.async_set_updated_data(self.state)
+        self.last_command_failure = None
+        # confirm the command with fast polls from now on
+        self._expected_deadline = monotonic() + COMMAND_CONFIRM_TIMEOUT
         self._set_poll_mode(fast=True)
-        return True
 
-    # async def async_shutdown(self) -> None:
-    #     # await self._client.disconnect(force=True)
-    #     await super().async_shutdown()
+    async def async_shutdown(self) -> None:
+        if self._commands_timer is not None:
+            self._commands_timer.cancel()
+            self._commands_timer = None
+        tasks = list(self._write_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for _, future in self._commands.values():
+            future.cancel()
+        self._commands = {}
+        if self._unsub_account is not None:
+            self._unsub_account()
+            self._unsub_account = None
+        await self.transport.stop()
+        await super().async_shutdown()
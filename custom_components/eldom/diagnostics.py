@@ -0,0 +1,43 @@
+"""Diagnostics support for Eldom."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_UNIQUE_ID
+from homeassistant.core import HomeAssistant
+
+from . import HomeAssistantEldomData
+from .const import CONF_PASSWORD, CONF_USERNAME, DOMAIN
+
+# the entry title is the username of the account
+TO_REDACT = {CONF_PASSWORD, CONF_USERNAME, "title", CONF_UNIQUE_ID}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    hass_data: HomeAssistantEldomData = hass.data[DOMAIN][entry.entry_id]
+    api = hass_data.api
+
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "metrics": api.metrics.as_dict(),
+        "scheduler": api.scheduler.stats,
+        "breaker": api.breaker.stats,
+        "devices": {
+            id: {
+                "name": c.device.display_name,
+                "last_update_success": c.last_update_success,
+                "update_interval": (
+                    c.update_interval.total_seconds() if c.update_interval else None
+                ),
+                "suppressed_updates": c.suppressed_updates,
+                "stale_age": c.stale_age,
+                "last_command_failure": c.last_command_failure,
+            }
+            for id, c in hass_data.coordinators.items()
+        },
+    }
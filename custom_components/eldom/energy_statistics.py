@@ -0,0 +1,141 @@
+"""Hourly energy statistics of Eldom heaters imported into the recorder."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Callable, NamedTuple, Optional
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    get_last_statistics,
+)
+from homeassistant.const import UnitOfEnergy
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util, slugify
+
+from .const import DOMAIN, LOGGER
+from .coordinator import EldomCoordinator
+
+HOUR = timedelta(hours=1)
+
+COUNTERS = {
+    "energy_day": "Energy Consumption R1",
+    "energy_night": "Energy Consumption R2",
+    "energy_total": "Total energy consumption",
+    "saved_energy_kwh": "Saved energy",
+}
+
+
+class _Row(NamedTuple):
+    start: datetime
+    state: float
+    sum: float
+
+
+class _Reading(NamedTuple):
+    hour: datetime
+    value: float
+
+
+class EldomEnergyStatistics:
+    """
+    Turns the energy counters of a heater into hourly external statistics.
+    A row is imported when an hour is complete, hours missed while offline
+    are backfilled with the energy used during the gap spread evenly over them.
+    """
+
+    def __init__(self, hass: HomeAssistant, coordinator: EldomCoordinator) -> None:
+        self._hass = hass
+        self._coordinator = coordinator
+        self._last: dict[str, Optional[_Row]] = {}
+        self._readings: dict[str, _Reading] = {}
+        self._unsub: Optional[Callable[[], None]] = None
+
+    def statistic_id(self, counter: str) -> str:
+        # the object id allows only [a-z0-9_] without double underscores
+        return f"{DOMAIN}:{slugify(f'{self._coordinator.id}_{counter}')}"
+
+    async def async_start(self) -> None:
+        """Load the last imported rows and start following the coordinator"""
+        recorder = get_instance(self._hass)
+        for counter in COUNTERS:
+            statistic_id = self.statistic_id(counter)
+            result = await recorder.async_add_executor_job(
+                get_last_statistics, self._hass, 1, statistic_id, True, {"state", "sum"}
+            )
+            row = None
+            if rows := result.get(statistic_id):
+                row = _Row(
+                    dt_util.utc_from_timestamp(rows[0]["start"]),
+                    rows[0]["state"] or 0.0,
+                    rows[0]["sum"] or 0.0,
+                )
+            self._last[counter] = row
+        self._unsub = self._coordinator.async_add_listener(self._handle_update)
+        self._handle_update()
+
+    @callback
+    def async_stop(self) -> None:
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _handle_update(self) -> None:
+        coordinator = self._coordinator
+        state = coordinator.data
+        if state is None or coordinator.stale_since is not None or coordinator.restored:
+            # only fresh readings are imported
+            return
+        hour = dt_util.utcnow().replace(minute=0, second=0, microsecond=0)
+        for counter in COUNTERS:
+            if (value := getattr(state, counter)) is not None:
+                self._update(counter, hour, float(value))
+
+    def _update(self, counter: str, hour: datetime, value: float) -> None:
+        last = self._last[counter]
+        reading = self._readings.get(counter)
+        self._readings[counter] = _Reading(hour, value)
+
+        if last is None:
+            # no history, the first reading is the baseline of the previous hour
+            self._last[counter] = _Row(hour - HOUR, value, 0.0)
+            return
+        if last.start + HOUR >= hour:
+            return
+
+        # hours from the last imported one up to the current one are complete
+        if reading is not None and reading.hour == hour - HOUR:
+            end_value = reading.value
+        else:
+            # no reading at the end of the previous hour, spread what we have
+            end_value = value
+        start_value = last.state
+        if end_value < start_value:
+            LOGGER.debug("%s counter reset %s -> %s", counter, start_value, end_value)
+            start_value = 0.0
+        delta = end_value - start_value
+
+        hours = int((hour - last.start) / HOUR) - 1
+        rows = [
+            StatisticData(
+                start=last.start + HOUR * (i + 1),
+                state=start_value + delta * (i + 1) / hours,
+                sum=last.sum + delta * (i + 1) / hours,
+            )
+            for i in range(hours)
+        ]
+        async_add_external_statistics(
+            self._hass,
+            StatisticMetaData(
+                has_mean=False,
+                has_sum=True,
+                name=f"{self._coordinator.device.display_name} {COUNTERS[counter]}",
+                source=DOMAIN,
+                statistic_id=self.statistic_id(counter),
+                unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+            ),
+            rows,
+        )
+        self._last[counter] = _Row(rows[-1]["start"], end_value, rows[-1]["sum"])
@@ -1,3 +1,6 @@
+from typing import Any
+
+from homeassistant.core import callback
 from homeassistant.helpers.entity import EntityDescription
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
@@ -8,11 +11,43 @@ from .coordinator import EldomCoordinator
 class EldomBaseEntity(CoordinatorEntity[EldomCoordinator]):
     """Eldom base entity class."""
 
+    _last_available: bool | None = None
+
     def __init__(self, coordinator: EldomCoordinator, description: EntityDescription):
         super().__init__(coordinator)
+        # state fields shown by the entity, it is updated only when one changes
+        self._state_fields = frozenset((description.key,))
         self._attr_unique_id = f"{self.coordinator.id}-{description.key}"
         self.entity_description = description
         self._attr_device_info = {
             "identifiers": {(DOMAIN, self.coordinator.id)},
             "model": self.coordinator.device.device_type.name,
         }
+
+    @property
+    def available(self) -> bool:
+        """Unavailable until the first state of the device is fetched."""
+        return super().available and self.coordinator.data is not None
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        attributes = {}
+        if self.coordinator.restored:
+            attributes["restored"] = True
+        if (since := self.coordinator.stale_since) is not None:
+            attributes.update(stale=True, stale_since=since.isoformat())
+        return attributes or None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        changed = self.coordinator.changed_fields
+        available = self.available
+        if (
+            changed is not None
+            and available == self._last_available
+            and changed.isdisjoint(self._state_fields)
+        ):
+            self.coordinator.suppressed_updates += 1
+            return
+        self._last_available = available
+        super()._handle_coordinator_update()
@@ -0,0 +1,148 @@
+from __future__ import annotations
+import bisect
+import math
+import re
+from time import monotonic
+from typing import Optional
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+LOGIN = "login"
+"""pseudo endpoint covering the whole login procedure"""
+
+_id_pattern = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """metrics key of a request, with numeric ids replaced by {id}"""
+    return f"{method} {_id_pattern.sub('/{id}', url.split('?', 1)[0])}"
+
+
+class EndpointMetrics:
+    """Latency histogram, outcome counts and response sizes of one endpoint"""
+
+    __slots__ = ("count", "errors", "bytes", "total_time", "max_time", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def record(self, latency: float, size: int, ok: bool) -> None:
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.bytes += size
+        self.total_time += latency
+        self.max_time = max(self.max_time, latency)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    @property
+    def avg_time(self) -> Optional[float]:
+        return self.total_time / self.count if self.count else None
+
+    def percentile(self, q: float) -> Optional[float]:
+        """upper bound of the bucket holding the q-th percentile"""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_time)
+        return self.max_time
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "avg_time": self.avg_time,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max_time": self.max_time,
+            "histogram": {
+                str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.buckets)
+            },
+        }
+
+
+class ApiMetrics:
+    """Request metrics of an EldomAPI client and the poll cycles using it"""
+
+    def __init__(self) -> None:
+        self.endpoints: dict[str, EndpointMetrics] = {}
+        self.polls = EndpointMetrics()
+        self.last_poll_duration: Optional[float] = None
+        self.last_poll_jitter: Optional[float] = None
+        self.max_poll_jitter = 0.0
+        # get_state answered from the cache, by a new request or a shared one
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_shared = 0
+
+    def record(self, endpoint: str, latency: float, size: int, ok: bool) -> None:
+        metrics = self.endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self.endpoints[endpoint] = EndpointMetrics()
+        metrics.record(latency, size, ok)
+
+    def record_poll(self, duration: float, jitter: Optional[float], ok: bool) -> None:
+        """a coordinator poll cycle, jitter is the deviation from its interval"""
+        self.polls.record(duration, 0, ok)
+        self.last_poll_duration = duration
+        if jitter is not None:
+            self.last_poll_jitter = jitter
+            self.max_poll_jitter = max(self.max_poll_jitter, jitter)
+
+    def get(self, endpoint: str) -> EndpointMetrics:
+        return self.endpoints.get(endpoint) or EndpointMetrics()
+
+    @property
+    def requests(self) -> int:
+        return sum(m.count for k, m in self.endpoints.items() if k != LOGIN)
+
+    @property
+    def errors(self) -> int:
+        return sum(m.errors for k, m in self.endpoints.items() if k != LOGIN)
+
+    @property
+    def bytes(self) -> int:
+        return sum(m.bytes for m in self.endpoints.values())
+
+    def as_dict(self) -> dict:
+        return {
+            "endpoints": {k: m.as_dict() for k, m in self.endpoints.items()},
+            "polls": self.polls.as_dict(),
+            "last_poll_duration": self.last_poll_duration,
+            "last_poll_jitter": self.last_poll_jitter,
+            "max_poll_jitter": self.max_poll_jitter,
+            "state_cache": {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "shared": self.cache_shared,
+            },
+        }
+
+
+class PollClock:
+    """Start times of a coordinator's polls, to measure their jitter"""
+
+    __slots__ = ("_last_start",)
+
+    def __init__(self) -> None:
+        self._last_start: Optional[float] = None
+
+    def start(self, interval: Optional[float]) -> tuple[float, Optional[float]]:
+        """start a poll, returns its start time and deviation from the interval"""
+        now = monotonic()
+        jitter = None
+        if self._last_start is not None and interval:
+            jitter = abs(now - self._last_start - interval)
+        self._last_start = now
+        return now, jitter
@@ -0,0 +1,178 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import logging
+from time import monotonic
+from typing import Optional
+
+_LOGGER = logging.getLogger(__package__)
+
+PRIORITY_COMMAND = 0
+"""user commands, served first"""
+PRIORITY_DEFAULT = 1
+"""login and device discovery"""
+PRIORITY_POLL = 2
+"""background state polls"""
+
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 60
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class RequestScheduler:
+    """
+    Token bucket limiting the request rate against the cloud.
+    Requests waiting for a token are served by priority, then in arrival order.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = monotonic()
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+        self.requests = 0
+        self.delayed = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self, priority: int = PRIORITY_DEFAULT) -> None:
+        """wait for a token"""
+        self.requests += 1
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+
+        self._loop = asyncio.get_running_loop()
+        future = self._loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        self._schedule()
+
+        start = monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the token was granted to a caller that is gone, give it back
+                self._tokens += 1
+            elif self._wakeup is not None and not self.queue_depth:
+                # nobody is left to wake up, like clients closed while waiting
+                self._wakeup.cancel()
+                self._wakeup = None
+                self._waiters.clear()
+            raise
+        finally:
+            wait = monotonic() - start
+            self.delayed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def _schedule(self) -> None:
+        if self._wakeup is None:
+            delay = max(0.0, (1 - self._tokens) / self._rate)
+            self._wakeup = self._loop.call_later(delay, self._release)
+
+    def _release(self) -> None:
+        self._wakeup = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                # the caller was cancelled while waiting
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        if self._waiters:
+            self._schedule()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "delayed": self.delayed,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_wait": self.total_wait / self.delayed if self.delayed else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+class CircuitBreaker:
+    """
+    Stops requests to the cloud after repeated failures.
+    While open, one probe request is let through every reset_timeout seconds,
+    its success closes the breaker again.
+    """
+
+    def __init__(
+        self,
+        threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+    ) -> None:
+        self._threshold = threshold
+        self._reset_timeout = reset_timeout
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        """whether a request can be sent now"""
+        if self.state == BREAKER_CLOSED:
+            return True
+        if monotonic() - self.opened_at >= self._reset_timeout:
+            # let a single probe through, another one if it never finishes
+            self.state = BREAKER_HALF_OPEN
+            self.opened_at = monotonic()
+            return True
+        return False
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self._reset_timeout - monotonic())
+
+    def success(self) -> None:
+        if self.state != BREAKER_CLOSED:
+            _LOGGER.info("Eldom cloud is reachable again")
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.state == BREAKER_HALF_OPEN or (
+            self.state == BREAKER_CLOSED and self.failures >= self._threshold
+        ):
+            if self.state == BREAKER_CLOSED:
+                _LOGGER.warning(
+                    "Eldom cloud unavailable after %s failures, "
+                    "pausing requests and probing every %ss",
+                    self.failures,
+                    self._reset_timeout,
+                )
+            self.state = BREAKER_OPEN
+            self.opened_at = monotonic()
+
+    @property
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
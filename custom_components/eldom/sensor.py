@@ -1,7 +1,9 @@
 """Support for smartlife sensors."""
 from __future__ import annotations
 
+from collections.abc import Callable, Iterable
 from dataclasses import dataclass
+from datetime import datetime, timedelta
 
 from homeassistant.components.sensor import (
     SensorDeviceClass,
@@ -10,16 +12,32 @@ from homeassistant.components.sensor import (
     SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import UnitOfEnergy, UnitOfTemperature
-from homeassistant.core import HomeAssistant
+from homeassistant.const import (
+    PERCENTAGE,
+    EntityCategory,
+    UnitOfEnergy,
+    UnitOfInformation,
+    UnitOfPower,
+    UnitOfTemperature,
+    UnitOfTime,
+)
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import StateType
+from homeassistant.util import dt as dt_util
 
 from . import HomeAssistantEldomData
-from .api import DeviceType
-from .const import DOMAIN, LOGGER
-from .coordinator import EldomCoordinator
+from .api import DeviceType, EldomAPI
+from .const import DOMAIN, LOGGER, SIGNAL_DEVICES_ADDED
+from .coordinator import TELEMETRY_FIELD, EldomCoordinator
 from .entity import EldomBaseEntity
+from .metrics import LOGIN
+
+# refresh interval of the diagnostic metric sensors
+SCAN_INTERVAL = timedelta(seconds=60)
+
+POLL_ENDPOINT = "GET /api/flatboiler/{id}"
 
 
 @dataclass
@@ -85,16 +103,157 @@ SENSORS: dict[DeviceType, tuple[EldomSensorEntityDescription, ...]] = {
 }
 
 
+@dataclass
+class EldomDerivedSensorEntityDescription(SensorEntityDescription):
+    """Describes Eldom sensor entity derived from recent telemetry."""
+
+    value_fn: Callable[[EldomCoordinator], StateType] = lambda coordinator: None
+
+
+def _timestamp(value: float | None) -> datetime | None:
+    return None if value is None else dt_util.utc_from_timestamp(value)
+
+
+DERIVED_SENSORS: dict[DeviceType, tuple[EldomDerivedSensorEntityDescription, ...]] = {
+    DeviceType.FLAT_WATER_HEATER: (
+        EldomDerivedSensorEntityDescription(
+            key="duty_cycle",
+            name="Heating duty cycle",
+            state_class=SensorStateClass.MEASUREMENT,
+            native_unit_of_measurement=PERCENTAGE,
+            icon="mdi:percent",
+            value_fn=lambda coordinator: coordinator.telemetry.duty_cycle,
+        ),
+        EldomDerivedSensorEntityDescription(
+            key="heat_up_rate",
+            name="Heat-up rate",
+            state_class=SensorStateClass.MEASUREMENT,
+            native_unit_of_measurement="°C/min",
+            icon="mdi:thermometer-chevron-up",
+            value_fn=lambda coordinator: coordinator.telemetry.heat_up_rate,
+        ),
+        EldomDerivedSensorEntityDescription(
+            key="estimated_power",
+            name="Estimated power",
+            device_class=SensorDeviceClass.POWER,
+            state_class=SensorStateClass.MEASUREMENT,
+            native_unit_of_measurement=UnitOfPower.KILO_WATT,
+            value_fn=lambda coordinator: coordinator.telemetry.power,
+        ),
+        EldomDerivedSensorEntityDescription(
+            key="target_reached_at",
+            name="Target temperature reached",
+            device_class=SensorDeviceClass.TIMESTAMP,
+            icon="mdi:timer-sand",
+            value_fn=lambda coordinator: _timestamp(coordinator.heat_up.eta),
+        ),
+    )
+}
+
+
+@dataclass
+class EldomMetricSensorEntityDescription(SensorEntityDescription):
+    """Describes Eldom diagnostic metric sensor entity."""
+
+    value_fn: Callable[[EldomAPI], StateType] = lambda api: None
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+METRIC_SENSORS: tuple[EldomMetricSensorEntityDescription, ...] = (
+    EldomMetricSensorEntityDescription(
+        key="requests",
+        name="Requests",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        icon="mdi:cloud-sync",
+        value_fn=lambda api: api.metrics.requests,
+    ),
+    EldomMetricSensorEntityDescription(
+        key="request_errors",
+        name="Request errors",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        icon="mdi:cloud-alert",
+        value_fn=lambda api: api.metrics.errors,
+    ),
+    EldomMetricSensorEntityDescription(
+        key="received_data",
+        name="Received data",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        value_fn=lambda api: api.metrics.bytes,
+    ),
+    EldomMetricSensorEntityDescription(
+        key="state_cache_hits",
+        name="State cache hits",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        icon="mdi:cached",
+        value_fn=lambda api: api.metrics.cache_hits + api.metrics.cache_shared,
+    ),
+    EldomMetricSensorEntityDescription(
+        key="state_cache_misses",
+        name="State cache misses",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        icon="mdi:cached",
+        value_fn=lambda api: api.metrics.cache_misses,
+    ),
+    EldomMetricSensorEntityDescription(
+        key="poll_latency",
+        name="Poll latency",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda api: _ms(api.metrics.get(POLL_ENDPOINT).avg_time),
+    ),
+    EldomMetricSensorEntityDescription(
+        key="poll_latency_p95",
+        name="Poll latency p95",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda api: _ms(api.metrics.get(POLL_ENDPOINT).percentile(95)),
+    ),
+    EldomMetricSensorEntityDescription(
+        key="login_latency",
+        name="Login latency",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda api: _ms(api.metrics.get(LOGIN).avg_time),
+    ),
+    EldomMetricSensorEntityDescription(
+        key="poll_cycle_duration",
+        name="Poll cycle duration",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda api: _ms(api.metrics.last_poll_duration),
+    ),
+    EldomMetricSensorEntityDescription(
+        key="poll_jitter",
+        name="Poll jitter",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda api: _ms(api.metrics.last_poll_jitter),
+    ),
+)
+
+
 async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
 ) -> None:
     hass_data: HomeAssistantEldomData = hass.data[DOMAIN][entry.entry_id]
-    entities = []
 
-    for id, device in hass_data.devices.items():
-        if descriptions := SENSORS.get(device.device_type):
+    @callback
+    def _async_add_devices(ids: Iterable[str]) -> None:
+        entities = []
+        for id in ids:
+            device = hass_data.devices[id]
             coordinator = hass_data.coordinators[id]
-            for description in descriptions:
+            for description in SENSORS.get(device.device_type, ()):
                 LOGGER.debug(
                     "creating sensor %s for %s:%s",
                     description.name,
@@ -102,8 +261,23 @@ async def async_setup_entry(
                     device.display_name,
                 )
                 entities.append(EldomSensorEntity(coordinator, description))
+            for description in DERIVED_SENSORS.get(device.device_type, ()):
+                entities.append(EldomDerivedSensorEntity(coordinator, description))
+        async_add_entities(entities)
 
-    async_add_entities(entities)
+    _async_add_devices(hass_data.devices)
+    entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_DEVICES_ADDED.format(entry.entry_id), _async_add_devices
+        )
+    )
+
+    if hass_data.client.is_owner(entry.entry_id):
+        # one set of metrics per client, not per entry sharing it
+        async_add_entities(
+            EldomMetricSensorEntity(hass_data.api, entry, description)
+            for description in METRIC_SENSORS
+        )
 
 
 class EldomSensorEntity(EldomBaseEntity, SensorEntity):
@@ -124,3 +298,41 @@ class EldomSensorEntity(EldomBaseEntity, SensorEntity):
             return getattr(self.coordinator.state, self.entity_description.key)
 
         return None
+
+
+class EldomDerivedSensorEntity(EldomBaseEntity, SensorEntity):
+    """Sensor computed from the recent telemetry samples of the heater."""
+
+    def __init__(
+        self,
+        coordinator: EldomCoordinator,
+        description: EldomDerivedSensorEntityDescription,
+    ) -> None:
+        super().__init__(coordinator, description)
+        self._state_fields = frozenset((TELEMETRY_FIELD,))
+
+    @property
+    def native_value(self) -> StateType:
+        return self.entity_description.value_fn(self.coordinator)
+
+
+class EldomMetricSensorEntity(SensorEntity):
+    """Diagnostic sensor of the account device showing client metrics."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = True
+
+    def __init__(
+        self,
+        api: EldomAPI,
+        entry: ConfigEntry,
+        description: EldomMetricSensorEntityDescription,
+    ) -> None:
+        self._api = api
+        self.entity_description = description
+        self._attr_unique_id = f"{entry.entry_id}-{description.key}"
+        self._attr_device_info = {"identifiers": {(DOMAIN, entry.entry_id)}}
+
+    @property
+    def native_value(self) -> StateType:
+        return self.entity_description.value_fn(self._api)
@@ -0,0 +1,138 @@
+"""Persistent storage for the Eldom integration."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.singleton import singleton
+from homeassistant.helpers.storage import Store
+
+from .api import Device, DeviceState, data_utils
+from .const import DOMAIN, LOGGER
+
+STORAGE_VERSION = 1
+SESSION_STORAGE_KEY = f"{DOMAIN}.sessions"
+SESSION_SAVE_DELAY = 1
+
+
+class EldomSessionStore:
+    """Authenticated cloud sessions keyed by endpoint and username."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._store = Store[dict[str, dict[str, str]]](
+            hass, STORAGE_VERSION, SESSION_STORAGE_KEY, private=True
+        )
+        self._data: dict[str, dict[str, str]] = {}
+
+    @staticmethod
+    def _key(endpoint: str, username: str) -> str:
+        return f"{endpoint}|{username}"
+
+    async def async_load(self) -> None:
+        self._data = await self._store.async_load() or {}
+
+    def get(self, endpoint: str, username: str) -> dict[str, str] | None:
+        return self._data.get(self._key(endpoint, username))
+
+    @callback
+    def async_set(self, endpoint: str, username: str, cookies: dict[str, str]) -> None:
+        self._data[self._key(endpoint, username)] = cookies
+        self._store.async_delay_save(lambda: self._data, SESSION_SAVE_DELAY)
+
+    @callback
+    def async_remove(self, endpoint: str, username: str) -> None:
+        if self._data.pop(self._key(endpoint, username), None) is not None:
+            self._store.async_delay_save(lambda: self._data, SESSION_SAVE_DELAY)
+
+
+@singleton(f"{DOMAIN}_session_store")
+async def async_get_session_store(hass: HomeAssistant) -> EldomSessionStore:
+    """Return the shared session store, loaded on first use."""
+    store = EldomSessionStore(hass)
+    await store.async_load()
+    return store
+
+
+STATE_STORAGE_KEY = f"{DOMAIN}.states.{{}}"
+# shorter than the default poll interval, a pending save is not pushed back
+STATE_SAVE_DELAY = 30
+
+
+class EldomStateStore:
+    """Last known device metadata and polled state of a config entry."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self._store = Store[dict[str, dict[str, Any]]](
+            hass, STORAGE_VERSION, STATE_STORAGE_KEY.format(entry_id), private=True
+        )
+        self._devices: dict[str, Device] = {}
+        self._states: dict[str, DeviceState] = {}
+        self._save_pending = False
+
+    async def async_load(self) -> None:
+        data = await self._store.async_load() or {}
+        for id, device in data.get("devices", {}).items():
+            try:
+                self._devices[id] = data_utils.from_dict(device, Device)
+                if (state := data.get("states", {}).get(id)) is not None:
+                    self._states[id] = data_utils.from_dict(state, DeviceState)
+            except (KeyError, TypeError, ValueError) as e:
+                LOGGER.debug("dropping the saved state of %s: %s", id, e)
+                self._devices.pop(id, None)
+
+    @property
+    def devices(self) -> dict[str, Device]:
+        return dict(self._devices)
+
+    def state(self, id: str) -> DeviceState | None:
+        return self._states.get(id)
+
+    @callback
+    def async_set(
+        self, id: str, device: Device, state: DeviceState | None
+    ) -> None:
+        if self._devices.get(id) == device and (
+            state is None or self._states.get(id) == state
+        ):
+            return
+        self._devices[id] = device
+        if state is not None:
+            self._states[id] = state
+        self._async_schedule_save()
+
+    @callback
+    def async_remove_device(self, id: str) -> None:
+        if self._devices.pop(id, None) is None:
+            return
+        self._states.pop(id, None)
+        self._async_schedule_save()
+
+    @callback
+    def _async_schedule_save(self) -> None:
+        # async_delay_save restarts its timer, frequent updates would never save
+        if not self._save_pending:
+            self._save_pending = True
+            self._store.async_delay_save(self._data, STATE_SAVE_DELAY)
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
+
+    def _data(self) -> dict[str, dict[str, Any]]:
+        # encoded when written, not on every update
+        self._save_pending = False
+        return {
+            "devices": {
+                id: data_utils.to_dict(device) for id, device in self._devices.items()
+            },
+            "states": {
+                id: data_utils.to_dict(state) for id, state in self._states.items()
+            },
+        }
+
+
+async def async_load_state_store(
+    hass: HomeAssistant, entry_id: str
+) -> EldomStateStore:
+    store = EldomStateStore(hass, entry_id)
+    await store.async_load()
+    return store
@@ -0,0 +1,204 @@
+from __future__ import annotations
+from array import array
+from typing import Optional
+
+from .api import DeviceState
+
+DEFAULT_TELEMETRY_SIZE = 120
+"""samples kept per heater, two hours at the normal poll interval"""
+
+# power_flag bits of the two cylinders
+ACTIVE_FLAGS = 4 | 8
+
+
+class TelemetryBuffer:
+    """
+    Fixed size ring buffer of recent heater samples, backed by typed arrays
+    (about 23 bytes per sample). Derived values are kept up to date
+    incrementally, every append is O(1).
+    """
+
+    __slots__ = (
+        "size",
+        "count",
+        "_head",
+        "_time",
+        "_first_temp",
+        "_second_temp",
+        "_power_flag",
+        "_set_temp",
+        "_energy",
+        "_active_time",
+        "_run_start",
+        "_energy_change",
+        "_prev_energy_change",
+    )
+
+    def __init__(self, size: int = DEFAULT_TELEMETRY_SIZE) -> None:
+        self.size = size
+        self.count = 0
+        self._head = 0
+        self._time = array("d", bytes(8 * size))
+        self._first_temp = array("h", bytes(2 * size))
+        self._second_temp = array("h", bytes(2 * size))
+        self._power_flag = array("B", bytes(size))
+        self._set_temp = array("h", bytes(2 * size))
+        self._energy = array("d", bytes(8 * size))
+        # seconds with a cylinder active between the buffered samples
+        self._active_time = 0.0
+        # (time, temperature) when the current heating run started
+        self._run_start: Optional[tuple[float, float]] = None
+        # (time, energy) of the last two changes of the energy counter
+        self._energy_change: Optional[tuple[float, float]] = None
+        self._prev_energy_change: Optional[tuple[float, float]] = None
+
+    def _index(self, age: int) -> int:
+        """buffer index of the sample age steps before the newest one"""
+        return (self._head - 1 - age) % self.size
+
+    def _active(self, i: int) -> bool:
+        return self._power_flag[i] & ACTIVE_FLAGS > 0
+
+    def _temp(self, i: int) -> float:
+        ft = self._first_temp[i]
+        st = self._second_temp[i]
+        if ft > 0 and st > 0:
+            return (ft + st) / 2
+        return max(ft, st)
+
+    def append(self, time: float, state: DeviceState) -> None:
+        size = self.size
+        if self.count == size:
+            # the oldest sample is overwritten, drop its interval
+            oldest = self._head
+            following = (oldest + 1) % size
+            if self._active(oldest):
+                self._active_time -= self._time[following] - self._time[oldest]
+
+        if self.count:
+            newest = self._index(0)
+            if self._active(newest):
+                self._active_time += time - self._time[newest]
+            was_active = self._active(newest)
+        else:
+            was_active = False
+
+        i = self._head
+        self._time[i] = time
+        self._first_temp[i] = state.first_cylinder_temp or 0
+        self._second_temp[i] = state.second_cylinder_temp or 0
+        self._power_flag[i] = (state.power_flag or 0) & 0xFF
+        self._set_temp[i] = state.set_temp or 0
+        self._energy[i] = state.energy_total or 0.0
+        self._head = (i + 1) % size
+        self.count = min(self.count + 1, size)
+
+        if not self._active(i):
+            self._run_start = None
+        elif not was_active or self._run_start is None:
+            self._run_start = (time, self._temp(i))
+
+        energy = self._energy[i]
+        if self._energy_change is None or energy != self._energy_change[1]:
+            self._prev_energy_change = self._energy_change
+            self._energy_change = (time, energy)
+
+    @property
+    def window(self) -> float:
+        """seconds covered by the buffered samples"""
+        if self.count < 2:
+            return 0.0
+        return self._time[self._index(0)] - self._time[self._index(self.count - 1)]
+
+    @property
+    def duty_cycle(self) -> Optional[float]:
+        """share of the window with a cylinder heating, in percent"""
+        window = self.window
+        if window <= 0:
+            return None
+        return round(100 * self._active_time / window, 1)
+
+    @property
+    def heat_up_rate(self) -> Optional[float]:
+        """temperature rise of the current heating run in °C per minute"""
+        if self._run_start is None or not self.count:
+            return None
+        newest = self._index(0)
+        start_time, start_temp = self._run_start
+        elapsed = self._time[newest] - start_time
+        if elapsed <= 0:
+            return None
+        return round((self._temp(newest) - start_temp) * 60 / elapsed, 2)
+
+    @property
+    def power(self) -> Optional[float]:
+        """power estimated from the last two energy counter changes in kW"""
+        if not self.count:
+            return None
+        if not self._active(self._index(0)):
+            return 0.0
+        if self._prev_energy_change is None:
+            return None
+        time0, energy0 = self._prev_energy_change
+        time1, energy1 = self._energy_change
+        if time1 <= time0 or energy1 < energy0:
+            return None
+        return round((energy1 - energy0) * 3600 / (time1 - time0), 2)
+
+
+HEAT_UP_SMOOTHING = 0.3
+"""weight of the newest observation in the learned heating rate"""
+
+HEAT_UP_MAX_GAP = 1800
+"""seconds between samples above which the rise is not used for learning"""
+
+
+class HeatUpEstimator:
+    """
+    Learns how fast a heater warms up, as an exponentially weighted moving
+    average per combination of active cylinders, and estimates when the
+    water reaches the target temperature. Every update is O(1).
+    """
+
+    __slots__ = ("rates", "eta", "_last")
+
+    def __init__(self) -> None:
+        # learned °C per second by power_flag
+        self.rates: dict[int, float] = {}
+        # timestamp the target temperature is expected at, None when not heating
+        self.eta: Optional[float] = None
+        # (time, temperature, power flag) of the previous sample
+        self._last: Optional[tuple[float, float, int]] = None
+
+    def update(self, time: float, state: DeviceState) -> None:
+        temp = state.current_temp
+        flag = (state.power_flag or 0) & ACTIVE_FLAGS
+        if temp is None:
+            self._last = None
+            self.eta = None
+            return
+
+        if self._last is not None:
+            last_time, last_temp, last_flag = self._last
+            elapsed = time - last_time
+            if (
+                flag
+                and flag == last_flag
+                and 0 < elapsed <= HEAT_UP_MAX_GAP
+                and temp >= last_temp
+            ):
+                # a drop while heating is hot water being used, not learned
+                observed = (temp - last_temp) / elapsed
+                rate = self.rates.get(flag)
+                self.rates[flag] = (
+                    observed
+                    if rate is None
+                    else rate + HEAT_UP_SMOOTHING * (observed - rate)
+                )
+        self._last = (time, temp, flag)
+
+        rate = self.rates.get(flag)
+        if not flag or not state.set_temp or temp >= state.set_temp or not rate:
+            self.eta = None
+        else:
+            self.eta = time + (state.set_temp - temp) / rate
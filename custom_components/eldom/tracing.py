@@ -0,0 +1,135 @@
+from __future__ import annotations
+import json
+import logging
+from logging.handlers import QueueListener, RotatingFileHandler
+import queue
+import re
+from typing import Any, Optional
+
+from .metrics import endpoint_name
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+BODY_LIMIT = 4096
+
+REDACTED = "**REDACTED**"
+REDACT_KEYS = {
+    "Email",
+    "Password",
+    "__RequestVerificationToken",
+    "email",
+    "alertEmail",
+    "firstName",
+    "lastName",
+    "ownerName",
+    "ip",
+}
+
+_id_pattern = re.compile(r"/(\d+)(?=/|$)")
+
+
+def redact(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: REDACTED if k in REDACT_KEYS else redact(v) for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+def _body(content: Any) -> Any:
+    if content is None:
+        return None
+    if isinstance(content, bytes):
+        try:
+            content = json.loads(content)
+        except ValueError:
+            # html pages are not traced, only their size
+            return None
+        if isinstance(content, dict) and isinstance(content.get("objectJson"), str):
+            content = {**content, "objectJson": json.loads(content["objectJson"])}
+    body = redact(content)
+    text = json.dumps(body)
+    return body if len(text) <= BODY_LIMIT else text[:BODY_LIMIT]
+
+
+def _device_id(url: str, request: Any) -> Optional[str]:
+    if isinstance(request, dict) and "deviceId" in request:
+        return str(request["deviceId"])
+    if match := _id_pattern.search(url):
+        return match.group(1)
+    return None
+
+
+class _TraceFormatter(logging.Formatter):
+    """Turns the raw request data into a JSON line, runs in the writer thread"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        method, url, start, end, status, request, response, error = record.msg
+        return json.dumps(
+            {
+                "endpoint": endpoint_name(method, url),
+                "method": method,
+                "url": url,
+                "device_id": _device_id(url, request),
+                "start": start,
+                "end": end,
+                "duration": end - start,
+                "status": status,
+                "size": len(response) if response is not None else 0,
+                "request": _body(request),
+                "response": _body(response),
+                "error": error,
+            },
+            separators=(",", ":"),
+        )
+
+
+class RequestTracer:
+    """
+    Writes a JSON line per request to a size capped, rotating file.
+    Formatting and file I/O run in a background thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backup_count: int = DEFAULT_BACKUP_COUNT,
+    ) -> None:
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True,
+        )
+        handler.setFormatter(_TraceFormatter())
+        self._handler = handler
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+
+    def trace(
+        self,
+        method: str,
+        url: str,
+        start: float,
+        end: float,
+        status: Optional[int],
+        request: Any,
+        response: Optional[bytes],
+        error: Optional[str] = None,
+    ) -> None:
+        record = logging.LogRecord(
+            "eldom.trace", logging.DEBUG, "", 0, None, None, None
+        )
+        record.msg = (method, url, start, end, status, request, response, error)
+        self._queue.put_nowait(record)
+
+    def close(self) -> None:
+        """Flush pending records and stop the writer thread, blocks"""
+        self._listener.stop()
+        self._handler.close()
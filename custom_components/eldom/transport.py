@@ -0,0 +1,147 @@
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Any, Callable, Coroutine, Optional
+
+from .api import (
+    Device,
+    DeviceState,
+    EldomAPI,
+    EldomAuthError,
+    EldomUnavailableError,
+    EldomUnsupportedError,
+)
+
+_LOGGER = logging.getLogger(__package__)
+
+TRANSPORT_POLLING = "polling"
+TRANSPORT_LONG_POLL = "long_poll"
+
+LONG_POLL_TIMEOUT = 55
+"""seconds the cloud holds a long poll open when nothing changes"""
+LONG_POLL_MAX_BACKOFF = 300
+"""longest wait before reconnecting after repeated failures"""
+
+
+class DeviceTransport:
+    """
+    Delivers the state of a device to its coordinator.
+    fetch reads the state once, started transports may also deliver states as
+    events, the coordinator stops polling while they are connected.
+    """
+
+    def __init__(self, api: EldomAPI, device: Device) -> None:
+        self._api = api
+        self.device = device
+        self.connected = False
+
+    async def fetch(self) -> DeviceState:
+        return await self._api.get_state(self.device)
+
+    def start(
+        self,
+        on_state: Callable[[DeviceState], None],
+        on_connection: Callable[[bool], None],
+        create_task: Callable[[Coroutine[Any, Any, None], str], asyncio.Task],
+    ) -> None:
+        """
+        start delivering states, on_connection is called when connected changes,
+        create_task(coro, name) runs the background work
+        """
+
+    async def stop(self) -> None:
+        pass
+
+
+class PollingTransport(DeviceTransport):
+    """States are fetched by the coordinator on its poll interval."""
+
+
+class LongPollTransport(DeviceTransport):
+    """
+    Holds a long poll open against the cloud, which answers as soon as the
+    device refreshes its state. The coordinator polls while it is disconnected,
+    and for good if the endpoint does not support long polling.
+    """
+
+    def __init__(
+        self, api: EldomAPI, device: Device, timeout: float = LONG_POLL_TIMEOUT
+    ) -> None:
+        super().__init__(api, device)
+        self._timeout = timeout
+        self._task: Optional[asyncio.Task] = None
+
+    def start(
+        self,
+        on_state: Callable[[DeviceState], None],
+        on_connection: Callable[[bool], None],
+        create_task: Callable[[Coroutine[Any, Any, None], str], asyncio.Task],
+    ) -> None:
+        if self._task is None:
+            self._task = create_task(
+                self._run(on_state, on_connection),
+                f"eldom long poll {self.device.id}",
+            )
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.connected = False
+
+    def _set_connected(
+        self, connected: bool, on_connection: Callable[[bool], None]
+    ) -> None:
+        if connected != self.connected:
+            self.connected = connected
+            on_connection(connected)
+
+    async def _run(
+        self,
+        on_state: Callable[[DeviceState], None],
+        on_connection: Callable[[bool], None],
+    ) -> None:
+        since = None
+        failures = 0
+        while True:
+            try:
+                if not await self._api.supports_long_poll(self.device):
+                    raise EldomUnsupportedError(
+                        "Long polling is not supported by the endpoint"
+                    )
+                state = await self._api.wait_state(self.device, since, self._timeout)
+            except EldomUnsupportedError as e:
+                _LOGGER.warning("%s, polling %s", e, self.device.display_name)
+                self._set_connected(False, on_connection)
+                return
+            except (EldomAuthError, EldomUnavailableError) as e:
+                failures += 1
+                delay = min(2**failures, LONG_POLL_MAX_BACKOFF)
+                _LOGGER.debug(
+                    "long poll of %s failed, retrying in %ss: %s",
+                    self.device.display_name,
+                    delay,
+                    e,
+                )
+                self._set_connected(False, on_connection)
+                await asyncio.sleep(delay)
+                continue
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("long poll of %s stopped", self.device.display_name)
+                self._set_connected(False, on_connection)
+                return
+            failures = 0
+            self._set_connected(True, on_connection)
+            if since is None or state.date != since:
+                since = state.date
+                on_state(state)
+
+
+def create_transport(kind: str, api: EldomAPI, device: Device) -> DeviceTransport:
+    if kind == TRANSPORT_LONG_POLL:
+        return LongPollTransport(api, device)
+    return PollingTransport(api, device)
@@ -1,3 +1,4 @@
+from collections.abc import Iterable
 from dataclasses import dataclass
 from typing import Any
 
@@ -8,10 +9,12 @@ from homeassistant.components.water_heater import (
     WaterHeaterEntityFeature,
 )
 from homeassistant.const import UnitOfTemperature
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 
 from . import HomeAssistantEldomData
 from .api import DeviceType, Mode
-from .const import BOOST, DOMAIN, LOGGER
+from .const import BOOST, DOMAIN, LOGGER, SIGNAL_DEVICES_ADDED
 from .coordinator import EldomCoordinator, SetState
 from .entity import EldomBaseEntity
 
@@ -31,15 +34,24 @@ HEATERS: dict[DeviceType, EldomHeaterEntityDescription] = {
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     hass_data: HomeAssistantEldomData = hass.data[DOMAIN][config_entry.entry_id]
-    entities = []
 
-    for id, device in hass_data.devices.items():
-        if descr := HEATERS.get(device.device_type):
-            coordinator = hass_data.coordinators[id]
-            LOGGER.debug("creating heater for %s:%s", id, device.display_name)
-            entities.append(EldomHeaterEntity(coordinator, descr))
-
-    async_add_entities(entities, True)
+    @callback
+    def _async_add_devices(ids: Iterable[str]) -> None:
+        entities = []
+        for id in ids:
+            device = hass_data.devices[id]
+            if descr := HEATERS.get(device.device_type):
+                coordinator = hass_data.coordinators[id]
+                LOGGER.debug("creating heater for %s:%s", id, device.display_name)
+                entities.append(EldomHeaterEntity(coordinator, descr))
+        async_add_entities(entities)
+
+    _async_add_devices(hass_data.devices)
+    config_entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_DEVICES_ADDED.format(config_entry.entry_id), _async_add_devices
+        )
+    )
 
 
 class EldomHeaterEntity(EldomBaseEntity, WaterHeaterEntity):
@@ -56,6 +68,9 @@ class EldomHeaterEntity(EldomBaseEntity, WaterHeaterEntity):
         description: WaterHeaterEntityDescription,
     ) -> None:
         super().__init__(coordinator, description)
+        self._state_fields = frozenset(
+            ("state", "has_boost", "current_temp", "set_temp")
+        )
         self._attr_name = coordinator.device.display_name
         self._attr_max_temp = 75
         self._attr_min_temp = 35
@@ -103,10 +118,8 @@ class EldomHeaterEntity(EldomBaseEntity, WaterHeaterEntity):
         if operation_mode == BOOST:
             await self.async_turn_on()
             await self.coordinator.async_set_state(SetState.BOOST, True)
-            self.coordinator.state.has_boost = True
         else:
             await self.coordinator.async_set_state(SetState.MODE, Mode[operation_mode])
-            self.coordinator.state.state = Mode[operation_mode]
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """turn on"""
@@ -0,0 +1,50 @@
+"""Fixtures of the Eldom tests."""
+from __future__ import annotations
+
+from collections.abc import AsyncGenerator, Callable, Coroutine
+from typing import Any
+
+from aiohttp.test_utils import TestServer
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.eldom.const import (
+    CONF_ENDPOINT,
+    CONF_PASSWORD,
+    CONF_USERNAME,
+    DOMAIN,
+)
+from tools.eldom_emulator import EldomEmulator, EmulatorConfig
+
+
+@pytest.fixture
+async def eldom_cloud(socket_enabled) -> AsyncGenerator[
+    Callable[..., Coroutine[Any, Any, tuple[str, EldomEmulator]]], None
+]:
+    """Start an emulated Eldom cloud, returns its endpoint and the emulator."""
+    servers: list[TestServer] = []
+
+    async def start(**config) -> tuple[str, EldomEmulator]:
+        emulator = EldomEmulator(EmulatorConfig(**config))
+        server = TestServer(emulator.app, host="127.0.0.1")
+        await server.start_server()
+        servers.append(server)
+        return str(server.make_url("")).rstrip("/"), emulator
+
+    yield start
+    for server in servers:
+        await server.close()
+
+
+def mock_entry(endpoint: str, **options) -> MockConfigEntry:
+    config = EmulatorConfig()
+    return MockConfigEntry(
+        domain=DOMAIN,
+        title=config.user,
+        data={
+            CONF_ENDPOINT: endpoint,
+            CONF_USERNAME: config.user,
+            CONF_PASSWORD: config.password,
+        },
+        options=options,
+    )
@@ -0,0 +1,47 @@
+"""Tests of the client shared by the entries of an account."""
+from __future__ import annotations
+
+import asyncio
+
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.eldom.const import DATA_CLIENTS, DOMAIN
+
+from .conftest import mock_entry
+
+
+async def test_entries_share_one_login(
+    enable_custom_integrations, hass: HomeAssistant, eldom_cloud
+) -> None:
+    """Entries set up together wait for one login and show one set of metrics."""
+    endpoint, emulator = await eldom_cloud(devices=1, latency=0.1)
+    entries = [mock_entry(endpoint), mock_entry(endpoint)]
+    for entry in entries:
+        entry.add_to_hass(hass)
+
+    assert all(
+        await asyncio.gather(
+            *(hass.config_entries.async_setup(entry.entry_id) for entry in entries)
+        )
+    )
+    assert all(entry.state is ConfigEntryState.LOADED for entry in entries)
+    assert len(emulator._sessions) == 1
+
+    registry = er.async_get(hass)
+    metrics = [
+        entity.config_entry_id
+        for entity in registry.entities.values()
+        if entity.unique_id.endswith("-requests")
+    ]
+    assert metrics == [entries[0].entry_id]
+
+    # the client stays open for the entry left
+    assert await hass.config_entries.async_unload(entries[0].entry_id)
+    client = next(iter(hass.data[DOMAIN][DATA_CLIENTS].values()))
+    assert client.entries == [entries[1].entry_id]
+    assert not client.api._session.closed
+
+    assert await hass.config_entries.async_unload(entries[1].entry_id)
+    assert DOMAIN not in hass.data
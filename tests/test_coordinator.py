@@ -0,0 +1,47 @@
+"""Tests of the device and account coordinators."""
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.eldom.const import (
+    CONF_POLL_MODE,
+    DOMAIN,
+    POLL_MODE_ACCOUNT,
+    POLL_MODE_DEVICE,
+)
+
+from .conftest import mock_entry
+
+
+@pytest.mark.parametrize("poll_mode", [POLL_MODE_DEVICE, POLL_MODE_ACCOUNT])
+async def test_changed_password_starts_reauth(
+    enable_custom_integrations, hass: HomeAssistant, eldom_cloud, poll_mode: str
+) -> None:
+    """A poll rejected for the credentials asks for the password again."""
+    endpoint, emulator = await eldom_cloud(devices=2)
+    entry = mock_entry(endpoint, **{CONF_POLL_MODE: poll_mode})
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    hass_data = hass.data[DOMAIN][entry.entry_id]
+
+    # the password is changed on the cloud, which ends the session
+    emulator.config.password = "changed"
+    emulator._sessions.clear()
+    for id, device in hass_data.devices.items():
+        hass_data.api.invalidate_state(device)
+        # due in the next account cycle
+        hass_data.coordinators[id]._next_poll = None
+    coordinator = hass_data.account or next(iter(hass_data.coordinators.values()))
+    with patch(
+        "homeassistant.config_entries.ConfigEntry.async_start_reauth"
+    ) as start_reauth:
+        await coordinator.async_refresh()
+    assert not coordinator.last_update_success
+    start_reauth.assert_called_once()
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
@@ -0,0 +1,97 @@
+"""Tests of the hourly energy statistics."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.eldom.energy_statistics import (
+    COUNTERS,
+    EldomEnergyStatistics,
+    _Row,
+)
+
+HOUR = timedelta(hours=1)
+START = datetime(2025, 1, 1, 10, tzinfo=timezone.utc)
+COUNTER = "energy_day"
+
+
+@pytest.fixture
+def imported():
+    """rows passed to the recorder, per call"""
+    calls: list[list[dict]] = []
+    with patch(
+        "custom_components.eldom.energy_statistics.async_add_external_statistics",
+        side_effect=lambda hass, metadata, rows: calls.append(rows),
+    ):
+        yield calls
+
+
+def statistics(last: _Row | None = None) -> EldomEnergyStatistics:
+    coordinator = SimpleNamespace(
+        id="EMU000001", device=SimpleNamespace(display_name="Flat water heater")
+    )
+    statistics = EldomEnergyStatistics(None, coordinator)
+    statistics._last = {counter: None for counter in COUNTERS}
+    statistics._last[COUNTER] = last
+    return statistics
+
+
+def rows(call: list[dict]) -> list[tuple[datetime, float, float]]:
+    return [
+        (row["start"], round(row["state"], 6), round(row["sum"], 6)) for row in call
+    ]
+
+
+def test_statistic_id() -> None:
+    assert statistics().statistic_id(COUNTER) == "eldom:emu000001_energy_day"
+
+
+def test_complete_hour(imported) -> None:
+    """an hour is imported with the last reading taken in it"""
+    s = statistics()
+    s._update(COUNTER, START, 10.0)
+    s._update(COUNTER, START, 10.5)
+    assert imported == []
+
+    s._update(COUNTER, START + HOUR, 11.5)
+    s._update(COUNTER, START + HOUR, 11.8)
+    assert [rows(call) for call in imported] == [[(START, 10.5, 0.5)]]
+
+    s._update(COUNTER, START + 2 * HOUR, 12.0)
+    assert rows(imported[-1]) == [(START + HOUR, 11.8, 1.8)]
+
+
+def test_gap_is_spread(imported) -> None:
+    """hours without readings share the energy used during the gap"""
+    s = statistics(_Row(START, 10.0, 4.0))
+    s._update(COUNTER, START + 4 * HOUR, 13.0)
+    assert rows(imported[0]) == [
+        (START + HOUR, 11.0, 5.0),
+        (START + 2 * HOUR, 12.0, 6.0),
+        (START + 3 * HOUR, 13.0, 7.0),
+    ]
+    assert s._last[COUNTER] == _Row(START + 3 * HOUR, 13.0, 7.0)
+
+
+def test_meter_reset(imported) -> None:
+    """a counter going down starts again from zero, the sum keeps growing"""
+    s = statistics(_Row(START, 120.0, 30.0))
+    s._update(COUNTER, START + HOUR, 1.0)
+    s._update(COUNTER, START + 2 * HOUR, 1.5)
+    assert rows(imported[0]) == [(START + HOUR, 1.0, 31.0)]
+
+    s._update(COUNTER, START + 3 * HOUR, 2.0)
+    assert rows(imported[1]) == [(START + 2 * HOUR, 1.5, 31.5)]
+
+
+def test_reset_during_gap(imported) -> None:
+    """the energy after a reset during a gap is spread over the missing hours"""
+    s = statistics(_Row(START, 120.0, 30.0))
+    s._update(COUNTER, START + 3 * HOUR, 4.0)
+    assert rows(imported[0]) == [
+        (START + HOUR, 2.0, 32.0),
+        (START + 2 * HOUR, 4.0, 34.0),
+    ]
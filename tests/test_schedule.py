@@ -0,0 +1,52 @@
+"""Tests of the poll schedules set in the options."""
+from __future__ import annotations
+
+from datetime import timedelta
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.eldom.const import (
+    CONF_DEVICES,
+    CONF_POLL_INTERVAL,
+    CONF_POLL_MODE,
+    DEFAULT_NORMAL_POLL,
+    DOMAIN,
+    POLL_MODE_ACCOUNT,
+)
+
+from .conftest import mock_entry
+
+
+async def test_account_cycle_follows_schedule(
+    enable_custom_integrations, hass: HomeAssistant, eldom_cloud
+) -> None:
+    """A changed schedule moves the next account cycle without waiting for it."""
+    endpoint, _ = await eldom_cloud(devices=2)
+    entry = mock_entry(endpoint, **{CONF_POLL_MODE: POLL_MODE_ACCOUNT})
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    hass_data = hass.data[DOMAIN][entry.entry_id]
+    account = hass_data.account
+    assert account.update_interval == timedelta(seconds=DEFAULT_NORMAL_POLL)
+
+    ids = list(hass_data.devices)
+    hass.config_entries.async_update_entry(
+        entry,
+        options={
+            **entry.options,
+            CONF_DEVICES: {id: {CONF_POLL_INTERVAL: 20} for id in ids[:1]},
+        },
+    )
+    await hass.async_block_till_done()
+    # the entry was not reloaded, the running coordinator was rescheduled
+    assert hass.data[DOMAIN][entry.entry_id].account is account
+    assert account.update_interval == timedelta(seconds=20)
+
+    hass.config_entries.async_update_entry(
+        entry, options={**entry.options, CONF_DEVICES: {}}
+    )
+    await hass.async_block_till_done()
+    assert account.update_interval == timedelta(seconds=DEFAULT_NORMAL_POLL)
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
@@ -0,0 +1,96 @@
+"""Startup time of the Eldom setup against an emulated cloud."""
+from __future__ import annotations
+
+import asyncio
+from time import monotonic
+from unittest.mock import patch
+
+from aiohttp import ClientSession, CookieJar
+import pytest
+
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.core import HomeAssistant
+
+from custom_components.eldom.api import EldomAPI
+from custom_components.eldom.const import (
+    DEFAULT_MAX_CONCURRENT,
+    DOMAIN,
+    STARTUP_STATE_TIMEOUT,
+)
+from tools.eldom_emulator import EmulatorConfig
+
+from .conftest import mock_entry
+
+# fixed, without jitter the setups differ only in how requests overlap
+LATENCY = 0.3
+
+
+async def sequential_startup(endpoint: str) -> float:
+    """seconds the setup took when it fetched the states one after another"""
+    config = EmulatorConfig()
+    start = monotonic()
+    async with ClientSession(cookie_jar=CookieJar(unsafe=True)) as session:
+        api = EldomAPI(endpoint, session)
+        assert await api.login(config.user, config.password)
+        for device in await api.get_devices():
+            await api.get_state(device)
+    return monotonic() - start
+
+
+async def all_states(hass: HomeAssistant, entry_id: str) -> None:
+    coordinators = hass.data[DOMAIN][entry_id].coordinators
+    while any(c.data is None for c in coordinators.values()):
+        await asyncio.sleep(0.05)
+
+
+@pytest.mark.parametrize("devices", [1, 2 * DEFAULT_MAX_CONCURRENT])
+async def test_startup_time(
+    enable_custom_integrations, hass: HomeAssistant, eldom_cloud, devices: int
+) -> None:
+    """
+    The initial states are fetched concurrently during the setup. With a single
+    heater there is nothing to overlap, the setup sends the same requests as the
+    sequential one and may only take as long.
+    """
+    endpoint, _ = await eldom_cloud(devices=devices, latency=LATENCY)
+    sequential = await sequential_startup(endpoint)
+
+    entry = mock_entry(endpoint)
+    entry.add_to_hass(hass)
+    start = monotonic()
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    forwarded = monotonic() - start
+    assert entry.state is ConfigEntryState.LOADED
+    coordinators = hass.data[DOMAIN][entry.entry_id].coordinators
+    assert len(coordinators) == devices
+    # all states answered before the startup timeout
+    assert all(c.data is not None for c in coordinators.values())
+    print(f"{devices} devices: sequential {sequential:.2f}s, setup {forwarded:.2f}s")
+
+    assert forwarded < STARTUP_STATE_TIMEOUT
+    if devices == 1:
+        assert forwarded < sequential + LATENCY
+    else:
+        # the states of the heaters overlap up to the concurrency limit
+        assert forwarded < sequential - (devices / 2) * LATENCY
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+
+
+async def test_slow_states_fill_in(
+    enable_custom_integrations, hass: HomeAssistant, eldom_cloud
+) -> None:
+    """The platforms are forwarded at the startup timeout, late states follow."""
+    endpoint, _ = await eldom_cloud(
+        devices=2 * DEFAULT_MAX_CONCURRENT, latency=LATENCY
+    )
+    entry = mock_entry(endpoint)
+    entry.add_to_hass(hass)
+    with patch("custom_components.eldom.STARTUP_STATE_TIMEOUT", LATENCY / 2):
+        assert await hass.config_entries.async_setup(entry.entry_id)
+    assert entry.state is ConfigEntryState.LOADED
+    coordinators = hass.data[DOMAIN][entry.entry_id].coordinators
+    assert any(c.data is None for c in coordinators.values())
+
+    await asyncio.wait_for(all_states(hass, entry.entry_id), 10)
+    assert await hass.config_entries.async_unload(entry.entry_id)
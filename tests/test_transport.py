@@ -0,0 +1,71 @@
+"""Tests of the long poll transport and its capability probe."""
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+from homeassistant.core import HomeAssistant
+from homeassistant.data_entry_flow import FlowResultType
+
+from custom_components.eldom.api import EldomUnsupportedError
+from custom_components.eldom.const import CONF_TRANSPORT, DOMAIN
+from custom_components.eldom.transport import TRANSPORT_LONG_POLL, TRANSPORT_POLLING
+
+from .conftest import mock_entry
+
+
+async def offered_transports(hass: HomeAssistant, entry_id: str) -> list[str]:
+    result = await hass.config_entries.options.async_init(entry_id)
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"], {"next_step_id": "account"}
+    )
+    assert result["type"] == FlowResultType.FORM
+    hass.config_entries.options.async_abort(result["flow_id"])
+    for key, validator in result["data_schema"].schema.items():
+        if key == CONF_TRANSPORT:
+            return list(validator.container)
+    raise AssertionError("no transport option")
+
+
+async def test_long_poll_where_supported(
+    enable_custom_integrations, hass: HomeAssistant, eldom_cloud
+) -> None:
+    """The emulator has the long poll endpoint, the states are pushed."""
+    endpoint, _ = await eldom_cloud(devices=2)
+    entry = mock_entry(endpoint, **{CONF_TRANSPORT: TRANSPORT_LONG_POLL})
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+
+    coordinators = hass.data[DOMAIN][entry.entry_id].coordinators.values()
+
+    async def connected() -> None:
+        while not all(c.transport.connected for c in coordinators):
+            await asyncio.sleep(0.05)
+
+    await asyncio.wait_for(connected(), 10)
+    assert await offered_transports(hass, entry.entry_id) == [
+        TRANSPORT_POLLING,
+        TRANSPORT_LONG_POLL,
+    ]
+    assert await hass.config_entries.async_unload(entry.entry_id)
+
+
+async def test_polling_where_unsupported(
+    enable_custom_integrations, hass: HomeAssistant, eldom_cloud
+) -> None:
+    """Without the endpoint long polling is not offered and the devices poll."""
+    endpoint, _ = await eldom_cloud(devices=2)
+    entry = mock_entry(endpoint, **{CONF_TRANSPORT: TRANSPORT_LONG_POLL})
+    entry.add_to_hass(hass)
+    with patch(
+        "custom_components.eldom.api.EldomAPI.wait_state",
+        side_effect=EldomUnsupportedError("not found"),
+    ) as wait_state:
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+        assert await offered_transports(hass, entry.entry_id) == [TRANSPORT_POLLING]
+    # probed once for the account
+    assert wait_state.call_count == 1
+    coordinators = hass.data[DOMAIN][entry.entry_id].coordinators.values()
+    assert not any(c.transport.connected for c in coordinators)
+    assert await hass.config_entries.async_unload(entry.entry_id)
@@ -0,0 +1,20 @@
+"""
+Makes the integration importable as the eldom package without Home Assistant.
+
+Only the modules free of Home Assistant imports (api, scheduler, metrics,
+tracing, telemetry) can be used this way. Import it before them:
+
+    from tools import _eldom  # noqa: F401
+    from eldom.api import EldomAPI
+"""
+import os
+import sys
+import types
+
+PACKAGE_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "custom_components", "eldom"
+)
+
+_package = types.ModuleType("eldom")
+_package.__path__ = [PACKAGE_PATH]
+sys.modules.setdefault("eldom", _package)
@@ -0,0 +1,229 @@
+"""
+Per-poll latency and thread use of a blocking and the asyncio Eldom client.
+
+The blocking client sends each poll through a thread pool, the way the
+integration used to call the requests based client through the executor. The
+asyncio client is the EldomAPI of the integration on the event loop. Start the
+emulator first, then
+
+    python -m tools.bench_clients --endpoint http://127.0.0.1:8080 --rounds 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar as BlockingCookieJar
+import json
+import os
+import re
+import sys
+import threading
+from time import monotonic
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from aiohttp import ClientSession, CookieJar
+
+from tools.eldom_trace import percentile
+
+from tools import _eldom  # noqa: F401
+from eldom.api import (
+    Device,
+    EldomAPI,
+    data_utils,
+    login_path,
+    login_request_token_name,
+    user_agent,
+    vtoken_pattern,
+)
+from eldom.scheduler import CircuitBreaker, RequestScheduler
+
+# the default number of executor threads of Home Assistant
+DEFAULT_WORKERS = 64
+
+
+class BlockingClient:
+    """login and state polling with blocking calls, like the old client"""
+
+    def __init__(self, endpoint: str) -> None:
+        self._endpoint = endpoint
+        self._opener = build_opener(HTTPCookieProcessor(BlockingCookieJar()))
+        self._headers = {"User-Agent": user_agent, "Referer": endpoint + "/"}
+
+    def _send(self, url: str, data: dict | None = None) -> tuple[str, bytes]:
+        body = urlencode(data).encode() if data is not None else None
+        request = Request(
+            urljoin(self._endpoint, url), data=body, headers=self._headers
+        )
+        with self._opener.open(request, timeout=30) as res:
+            return res.geturl(), res.read()
+
+    def login(self, user: str, password: str) -> None:
+        url, content = self._send(login_path)
+        token = re.search(vtoken_pattern, content.decode()).group("token")
+        self._headers["Referer"] = url
+        self._send(
+            login_path,
+            {"Email": user, "Password": password, login_request_token_name: token},
+        )
+
+    def get_devices(self) -> list[Device]:
+        _, content = self._send("/api/device/getmy")
+        return data_utils.from_json(content, list[Device])
+
+    def get_state(self, device: Device) -> None:
+        _, content = self._send(f"/api/flatboiler/{device.id}")
+        EldomAPI._decode_state(content)
+
+
+class ThreadUse:
+    """samples the running threads while a benchmark runs"""
+
+    def __init__(self) -> None:
+        self.peak = threading.active_count()
+        self._busy = 0
+        self.peak_busy = 0
+        self._lock = threading.Lock()
+
+    def sample(self) -> None:
+        self.peak = max(self.peak, threading.active_count())
+
+    def enter(self) -> None:
+        with self._lock:
+            self._busy += 1
+            self.peak_busy = max(self.peak_busy, self._busy)
+            self.sample()
+
+    def exit(self) -> None:
+        with self._lock:
+            self._busy -= 1
+
+
+async def bench_blocking(args, targets: int) -> tuple[list[float], ThreadUse, float]:
+    client = BlockingClient(args.endpoint)
+    loop = asyncio.get_running_loop()
+    use = ThreadUse()
+    latencies: list[float] = []
+
+    def poll(device: Device) -> None:
+        use.enter()
+        try:
+            client.get_state(device)
+        finally:
+            use.exit()
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        await loop.run_in_executor(executor, client.login, args.user, args.password)
+        devices = await loop.run_in_executor(executor, client.get_devices)
+        devices = [devices[i % len(devices)] for i in range(targets)]
+
+        async def timed(device: Device) -> None:
+            # the time waiting for a free thread counts, as it did in the coordinator
+            start = monotonic()
+            await loop.run_in_executor(executor, poll, device)
+            latencies.append(monotonic() - start)
+
+        start = monotonic()
+        for _ in range(args.rounds):
+            await asyncio.gather(*(timed(device) for device in devices))
+        elapsed = monotonic() - start
+    return latencies, use, elapsed
+
+
+async def bench_async(args, targets: int) -> tuple[list[float], ThreadUse, float]:
+    use = ThreadUse()
+    latencies: list[float] = []
+    # cookies of IP endpoints like a local emulator are kept too
+    async with ClientSession(cookie_jar=CookieJar(unsafe=True)) as session:
+        api = EldomAPI(
+            args.endpoint,
+            session,
+            scheduler=RequestScheduler(rate=1e9, burst=max(1, targets)),
+            breaker=CircuitBreaker(threshold=sys.maxsize),
+            state_cache_ttl=0,
+        )
+        if not await api.login(args.user, args.password):
+            raise SystemExit("login failed")
+        devices = await api.get_devices()
+        devices = [devices[i % len(devices)] for i in range(targets)]
+
+        async def timed(device: Device) -> None:
+            use.sample()
+            start = monotonic()
+            # not get_state, repeated devices must not share one request
+            await api.fetch_state(device)
+            latencies.append(monotonic() - start)
+
+        start = monotonic()
+        for _ in range(args.rounds):
+            await asyncio.gather(*(timed(device) for device in devices))
+        elapsed = monotonic() - start
+    return latencies, use, elapsed
+
+
+def summary(
+    name: str, latencies: list[float], use: ThreadUse, elapsed: float
+) -> dict:
+    values = sorted(v * 1000 for v in latencies)
+    return {
+        "client": name,
+        "polls": len(values),
+        "seconds": round(elapsed, 3),
+        "polls_per_second": round(len(values) / elapsed, 1),
+        "p50_ms": round(percentile(values, 50), 1),
+        "p95_ms": round(percentile(values, 95), 1),
+        "p99_ms": round(percentile(values, 99), 1),
+        "max_ms": round(values[-1], 1),
+        "peak_threads": use.peak,
+        "peak_busy_threads": use.peak_busy,
+    }
+
+
+async def run(args) -> list[dict]:
+    results = []
+    for name, bench in (("blocking", bench_blocking), ("async", bench_async)):
+        latencies, use, elapsed = await bench(args, args.devices)
+        results.append(summary(name, latencies, use, elapsed))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--endpoint", default=os.environ.get("ELDOM_ENDPOINT", "http://127.0.0.1:8080")
+    )
+    parser.add_argument(
+        "--user", default=os.environ.get("ELDOM_USER", "user@example.com")
+    )
+    parser.add_argument(
+        "--password", default=os.environ.get("ELDOM_PASSWORD", "password")
+    )
+    parser.add_argument("--devices", type=int, default=20, help="polls per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="blocking client threads"
+    )
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    header = (
+        f"{'client':<9} {'polls':>6} {'polls/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'max ms':>8} {'threads':>7} {'busy':>5}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['client']:<9} {r['polls']:>6} {r['polls_per_second']:>8} "
+            f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['max_ms']:>8} "
+            f"{r['peak_threads']:>7} {r['peak_busy_threads']:>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Decode and encode throughput of the Eldom data classes.
+
+Times data_utils against the per call mapping walk it replaced, on payloads
+shaped like the cloud responses:
+
+    python -m tools.bench_data_utils --number 20000
+"""
+from __future__ import annotations
+
+import argparse
+import collections
+import dataclasses
+import json
+import time
+import timeit
+
+from tools.eldom_emulator import EmulatorConfig, Heater
+
+from tools import _eldom  # noqa: F401
+from eldom.api import Device, DeviceState, EldomAPI, User, data_utils
+
+
+def legacy_from_json(content, cls):
+    """the baseline decoder, walking the mappings on every call"""
+    kvs = json.loads(content)
+    if isinstance(kvs, (collections.abc.Sequence)):
+        res = []
+        if cls.__origin__ == list:
+            cls = cls.__args__[0]
+        type_mappings = data_utils._mappings[cls]
+        for item in kvs:
+            p = {}
+            for k, v in type_mappings.items():
+                if v in item:
+                    p[k] = item[v]
+            obj = cls(**p)
+            if hasattr(obj, "_init") and callable(obj._init):
+                obj._init()
+            res.append(obj)
+        return res
+    p = {}
+    type_mappings = data_utils._mappings[cls]
+    for k, v in type_mappings.items():
+        if v in kvs:
+            p[k] = kvs[v]
+    obj = cls(**p)
+    if hasattr(obj, "_init") and callable(obj._init):
+        obj._init()
+    return obj
+
+
+class Unslotted:
+    """a data class instance with a __dict__, as before the classes had slots"""
+
+    cls: type
+
+    def __init__(self, obj) -> None:
+        self.__dict__.update(
+            (f.name, getattr(obj, f.name)) for f in dataclasses.fields(obj)
+        )
+
+
+_unslotted_types: dict[type, type] = {}
+
+
+def unslotted(obj):
+    """copies of obj that vars() works on, the baseline encoder needs them"""
+    if isinstance(obj, (collections.abc.Sequence)):
+        return [unslotted(item) for item in obj]
+    cls = type(obj)
+    if cls not in _unslotted_types:
+        _unslotted_types[cls] = type(cls.__name__, (Unslotted,), {"cls": cls})
+    return _unslotted_types[cls](obj)
+
+
+def legacy_to_dict(obj):
+    """the baseline to_json encoder without its json.dumps, walking vars()"""
+    if isinstance(obj, (collections.abc.Sequence)):
+        type_mappings = None
+        res = []
+        for item in obj:
+            r = {}
+            type_mappings = (
+                type_mappings
+                if type_mappings is not None
+                else data_utils._mappings[item.cls]
+            )
+            for name, value in vars(item).items():
+                if name in type_mappings:
+                    r[type_mappings[name]] = data_utils._value(value)
+            res.append(r)
+        return res
+    r = {}
+    type_mappings = data_utils._mappings[obj.cls]
+    for name, value in vars(obj).items():
+        if name in type_mappings:
+            r[type_mappings[name]] = data_utils._value(value)
+    return r
+
+
+def legacy_decode_state(content: bytes) -> DeviceState:
+    """the state decoded in two passes, the response and then objectJson"""
+    return legacy_from_json(json.loads(content)["objectJson"], DeviceState)
+
+
+def payloads(devices: int) -> dict[str, bytes]:
+    config = EmulatorConfig()
+    heaters = [
+        Heater(i + 1, f"EMU{i + 1:06d}", f"Heater {i + 1}") for i in range(devices)
+    ]
+    now = time.monotonic()
+    states = [heater.report(now, config) for heater in heaters]
+    user = {
+        "id": 1,
+        "email": config.user,
+        "firstName": "Eldom",
+        "lastName": "Emulator",
+        "language": 1,
+        "isActive": True,
+    }
+    return {
+        "user": json.dumps(user).encode(),
+        "devices": json.dumps([heater.device() for heater in heaters]).encode(),
+        "state": json.dumps({"objectJson": json.dumps(states[0])}).encode(),
+    }
+
+
+def cases(data: dict[str, bytes]) -> list[tuple[str, object, object]]:
+    """name, current and legacy callables"""
+    user = data_utils.from_json(data["user"], User)
+    devices = data_utils.from_json(data["devices"], list[Device])
+    state = EldomAPI._decode_state(data["state"])
+    legacy = {"user": unslotted(user), "devices": unslotted(devices)}
+    legacy["state"] = unslotted(state)
+    return [
+        (
+            "decode User",
+            lambda: data_utils.from_json(data["user"], User),
+            lambda: legacy_from_json(data["user"], User),
+        ),
+        (
+            f"decode list[Device] ({len(devices)})",
+            lambda: data_utils.from_json(data["devices"], list[Device]),
+            lambda: legacy_from_json(data["devices"], list[Device]),
+        ),
+        (
+            "decode DeviceState",
+            lambda: EldomAPI._decode_state(data["state"]),
+            lambda: legacy_decode_state(data["state"]),
+        ),
+        ("encode User", lambda: data_utils.to_dict(user), lambda: legacy_to_dict(legacy["user"])),
+        (
+            f"encode list[Device] ({len(devices)})",
+            lambda: data_utils.to_dict(devices),
+            lambda: legacy_to_dict(legacy["devices"]),
+        ),
+        (
+            "encode DeviceState",
+            lambda: data_utils.to_dict(state),
+            lambda: legacy_to_dict(legacy["state"]),
+        ),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=20000, help="calls per timing")
+    parser.add_argument("--repeat", type=int, default=5, help="timings, best is kept")
+    parser.add_argument("--devices", type=int, default=10, help="device list size")
+    args = parser.parse_args()
+
+    header = f"{'case':<28} {'current/s':>11} {'legacy/s':>11} {'speedup':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, current, legacy in cases(payloads(args.devices)):
+        rates = [
+            args.number / min(timeit.repeat(fn, number=args.number, repeat=args.repeat))
+            for fn in (current, legacy)
+        ]
+        print(
+            f"{name:<28} {rates[0]:>11.0f} {rates[1]:>11.0f} "
+            f"{rates[0] / rates[1]:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
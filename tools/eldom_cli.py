@@ -0,0 +1,252 @@
+"""
+Command line client and load test for the Eldom cloud.
+
+Uses the EldomAPI of the integration without Home Assistant. Credentials come
+from --user/--password or ELDOM_USER/ELDOM_PASSWORD, the session is kept in
+--session-file so later commands do not login again:
+
+    python -m tools.eldom_cli --endpoint http://127.0.0.1:8080 login
+    python -m tools.eldom_cli devices
+    python -m tools.eldom_cli state "Heater 1"
+    python -m tools.eldom_cli set "Heater 1" temp 55
+    python -m tools.eldom_cli bench --devices 20 --concurrency 8 --rounds 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from time import monotonic
+
+from aiohttp import ClientSession, CookieJar
+
+from tools.eldom_trace import percentile
+
+from tools import _eldom  # noqa: F401
+from eldom.api import (
+    Device,
+    EldomAPI,
+    EldomAuthError,
+    EldomUnavailableError,
+    Mode,
+    data_utils,
+)
+from eldom.scheduler import CircuitBreaker, RequestScheduler
+
+DEFAULT_ENDPOINT = "https://myeldom.com"
+DEFAULT_SESSION_FILE = os.path.expanduser("~/.eldom_session.json")
+# requests per second standing for no rate limit in the bench
+UNLIMITED_RATE = 1e9
+
+
+def _load_session(path: str, endpoint: str, user: str) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as file:
+            saved = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if saved.get("endpoint") != endpoint or saved.get("user") != user:
+        return None
+    return saved.get("cookies")
+
+
+def _save_session(path: str, endpoint: str, user: str, cookies: dict) -> None:
+    # the cookies authenticate the account, readable by the owner only
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(fd, "w", encoding="utf-8") as file:
+        json.dump({"endpoint": endpoint, "user": user, "cookies": cookies}, file)
+
+
+def _check_credentials(args) -> None:
+    if not args.user or not args.password:
+        raise SystemExit(
+            "credentials missing, use --user/--password or ELDOM_USER/ELDOM_PASSWORD"
+        )
+
+
+async def _connect(args, session: ClientSession, **kwargs) -> EldomAPI:
+    """client with the saved session restored, logged in if there is none"""
+    _check_credentials(args)
+    api = EldomAPI(args.endpoint, session, **kwargs)
+    api.session_listener = lambda cookies: _save_session(
+        args.session_file, args.endpoint, args.user, cookies
+    )
+    cookies = _load_session(args.session_file, args.endpoint, args.user)
+    if not api.restore_session(args.user, args.password, cookies):
+        if not await api.login(args.user, args.password):
+            raise SystemExit("login failed")
+    return api
+
+
+def _find(devices: list[Device], name: str) -> Device:
+    for device in devices:
+        if name in (str(device.id), device.real_device_id, device.name):
+            return device
+    raise SystemExit(f"no device {name!r}, see the devices command")
+
+
+async def cmd_login(args, session: ClientSession) -> None:
+    _check_credentials(args)
+    api = EldomAPI(args.endpoint, session)
+    if not await api.login(args.user, args.password):
+        raise SystemExit("login failed")
+    _save_session(args.session_file, args.endpoint, args.user, api.export_session())
+    user = await api.get_user()
+    print(f"logged in as {user.email}, session saved to {args.session_file}")
+
+
+async def cmd_devices(args, session: ClientSession) -> None:
+    api = await _connect(args, session)
+    devices = await api.get_devices()
+    if args.json:
+        print(json.dumps(data_utils.to_dict(devices), indent=2))
+        return
+    print(
+        f"{'id':>8} {'real id':<16} {'type':<18} {'hw':>3} {'sw':>3} "
+        f"{'refreshed':<20} name"
+    )
+    for d in devices:
+        print(
+            f"{d.id:>8} {d.real_device_id:<16} {d.device_type.name:<18} "
+            f"{d.hw_version or '':>3} {d.sw_version or '':>3} "
+            f"{d.last_data_refresh_date or '':<20} {d.name}"
+        )
+
+
+async def cmd_state(args, session: ClientSession) -> None:
+    api = await _connect(args, session)
+    device = _find(await api.get_devices(), args.device)
+    state = await api.get_state(device)
+    if args.json:
+        print(json.dumps(data_utils.to_dict(state), indent=2))
+    else:
+        print(state)
+
+
+async def cmd_set(args, session: ClientSession) -> None:
+    api = await _connect(args, session)
+    device = _find(await api.get_devices(), args.device)
+    match args.what:
+        case "temp":
+            await api.set_temperature(device, int(args.value))
+        case "boost":
+            boost = args.value.lower() in ("1", "on", "true")
+            await api.set_power_boost(device, boost)
+        case "mode":
+            if args.value.upper() not in Mode.__members__:
+                raise SystemExit(
+                    "mode must be one of " + ", ".join(m.name.lower() for m in Mode)
+                )
+            await api.set_state(device, Mode[args.value.upper()])
+    print("ok")
+
+
+async def cmd_bench(args, session: ClientSession) -> None:
+    # the integration limits and caches requests, the bench measures the cloud
+    rate = args.rate if args.rate > 0 else UNLIMITED_RATE
+    api = await _connect(
+        args,
+        session,
+        scheduler=RequestScheduler(rate=rate, burst=max(1, args.concurrency)),
+        breaker=CircuitBreaker(threshold=sys.maxsize),
+    )
+    devices = await api.get_devices()
+    if not devices:
+        raise SystemExit("the account has no devices")
+    targets = [devices[i % len(devices)] for i in range(args.devices or len(devices))]
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def poll(device: Device) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = monotonic()
+            try:
+                # not get_state, repeated devices must not share one request
+                await api.fetch_state(device)
+            except (EldomAuthError, EldomUnavailableError, ValueError) as e:
+                errors += 1
+                if args.verbose:
+                    print(f"{device.real_device_id}: {e}", file=sys.stderr)
+                return
+            latencies.append(monotonic() - start)
+
+    sent = api.scheduler.requests
+    start = monotonic()
+    for _ in range(args.rounds):
+        await asyncio.gather(*(poll(device) for device in targets))
+    elapsed = monotonic() - start
+
+    total = len(targets) * args.rounds
+    print(
+        f"{total} polls of {len(targets)} devices, concurrency {args.concurrency}, "
+        f"{elapsed:.2f}s"
+    )
+    print(
+        f"throughput {total / elapsed:.1f} req/s, errors {errors}, "
+        f"requests sent {api.scheduler.requests - sent}"
+    )
+    if latencies:
+        values = sorted(v * 1000 for v in latencies)
+        print(
+            f"latency ms p50 {percentile(values, 50):.1f} "
+            f"p95 {percentile(values, 95):.1f} p99 {percentile(values, 99):.1f} "
+            f"max {values[-1]:.1f}"
+        )
+        # a poll cycle takes about this long, the interval should stay well above
+        cycle = len(targets) / args.concurrency * percentile(values, 50) / 1000
+        print(f"estimated cycle of {len(targets)} devices: {cycle:.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--endpoint", default=os.environ.get("ELDOM_ENDPOINT", DEFAULT_ENDPOINT)
+    )
+    parser.add_argument("--user", default=os.environ.get("ELDOM_USER"))
+    parser.add_argument("--password", default=os.environ.get("ELDOM_PASSWORD"))
+    parser.add_argument("--session-file", default=DEFAULT_SESSION_FILE)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("login", help="login and save the session")
+    devices = commands.add_parser("devices", help="list the devices of the account")
+    devices.add_argument("--json", action="store_true")
+    state = commands.add_parser("state", help="print the state of a device")
+    state.add_argument("device", help="id, real device id or name")
+    state.add_argument("--json", action="store_true")
+    set_ = commands.add_parser("set", help="send a command to a device")
+    set_.add_argument("device", help="id, real device id or name")
+    set_.add_argument("what", choices=["temp", "boost", "mode"])
+    set_.add_argument(
+        "value", help="35-75, on/off or " + "/".join(m.name.lower() for m in Mode)
+    )
+    bench = commands.add_parser("bench", help="poll devices and report latency")
+    bench.add_argument(
+        "--devices", type=int, default=0, help="polls per round, all devices by default"
+    )
+    bench.add_argument("--concurrency", type=int, default=4)
+    bench.add_argument("--rounds", type=int, default=3)
+    bench.add_argument(
+        "--rate", type=float, default=0, help="request rate limit, 0 for none"
+    )
+    bench.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    async def run() -> None:
+        # cookies of IP endpoints like a local emulator are kept too
+        async with ClientSession(cookie_jar=CookieJar(unsafe=True)) as session:
+            try:
+                await globals()[f"cmd_{args.command}"](args, session)
+            except (RuntimeError, ValueError, KeyError) as e:
+                # cloud errors and rejected commands, not a bug of the client
+                raise SystemExit(f"{args.command} failed: {e}") from e
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
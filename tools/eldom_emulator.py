@@ -0,0 +1,377 @@
+"""
+Local stand-in for the myeldom.com cloud.
+
+Implements the endpoints used by EldomAPI, simulates flat water heaters and
+can inject latency, errors and session expiry. Run it with
+
+    python -m tools.eldom_emulator --devices 20 --latency 0.2 --error-rate 0.05
+
+and point the integration or the client at http://127.0.0.1:8080.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+import datetime
+import json
+import random
+import secrets
+import time
+
+from aiohttp import web
+
+auth_cookie_name = ".AspNetCore.cookieath"
+login_page = (
+    '<html><body><form method="post" action="/Account/Login">'
+    '<input name="Email" /><input name="Password" type="password" />'
+    '<input name="__RequestVerificationToken" type="hidden" value="{token}">'
+    "</form></body></html>"
+)
+
+# heater model
+cylinder_power_kw = 1.2
+heat_rate_per_cylinder = 0.5 / 60  # °C per second
+cool_rate = 0.05 / 60  # °C per second
+ambient_temp = 20.0
+hysteresis = 3
+night_hours = range(22, 24), range(0, 6)
+
+
+@dataclass
+class EmulatorConfig:
+    devices: int = 3
+    user: str = "user@example.com"
+    password: str = "password"
+    latency: float = 0.0
+    """mean added latency of every request in seconds"""
+    jitter: float = 0.0
+    """random extra latency up to this many seconds"""
+    error_rate: float = 0.0
+    """share of API requests answered with HTTP 500"""
+    session_ttl: float = 0.0
+    """seconds a session stays valid, 0 never expires"""
+    refresh_interval: float = 30.0
+    """seconds between device data pushes to the cloud"""
+    apply_delay: float = 2.0
+    """seconds until a device applies a command"""
+    time_scale: float = 1.0
+    """speed up the heater simulation"""
+    seed: int | None = None
+
+
+@dataclass
+class Heater:
+    id: int
+    real_device_id: str
+    name: str
+    state: int = 1
+    set_temp: int = 60
+    has_boost: bool = False
+    temps: list[float] = field(default_factory=lambda: [35.0, 30.0])
+    active: list[bool] = field(default_factory=lambda: [False, False])
+    energy_day: float = 0.0
+    energy_night: float = 0.0
+    saved_energy: int = 0
+    updated: float = field(default_factory=time.monotonic)
+    reported: dict = field(default_factory=dict)
+    reported_at: float = 0.0
+    pending: list[tuple[float, str, object]] = field(default_factory=list)
+
+    def step(self, now: float, config: EmulatorConfig) -> None:
+        """Advance the simulation to now"""
+        for item in [p for p in self.pending if p[0] <= now]:
+            self.pending.remove(item)
+            setattr(self, item[1], item[2])
+
+        dt = (now - self.updated) * config.time_scale
+        self.updated = now
+        if dt <= 0:
+            return
+
+        avg = sum(self.temps) / 2
+        heating = self.state != 0 and (
+            avg < self.set_temp - hysteresis or (any(self.active) and avg < self.set_temp)
+        )
+        cylinders = (2 if self.has_boost else 1) if heating else 0
+        self.active = [cylinders > 0, cylinders > 1]
+        for i, on in enumerate(self.active):
+            if on:
+                self.temps[i] = min(self.temps[i] + heat_rate_per_cylinder * dt, 80)
+            else:
+                loss = cool_rate * dt * (self.temps[i] - ambient_temp) / 40
+                self.temps[i] = max(self.temps[i] - loss, ambient_temp)
+        if self.has_boost and avg >= self.set_temp:
+            self.has_boost = False
+
+        energy = cylinders * cylinder_power_kw * dt / 3600
+        hour = datetime.datetime.now().hour
+        if any(hour in r for r in night_hours):
+            self.energy_night += energy
+        else:
+            self.energy_day += energy
+
+    def report(self, now: float, config: EmulatorConfig) -> dict:
+        """State the cloud knows, refreshed every refresh_interval"""
+        if not self.reported or now - self.reported_at >= config.refresh_interval:
+            self.reported_at = now
+            date = datetime.datetime.now().replace(microsecond=0).isoformat()
+            power_flag = (4 if self.active[0] else 0) | (8 if self.active[1] else 0)
+            self.reported = {
+                "DeviceID": self.real_device_id,
+                "State": self.state,
+                "Type": 7,
+                "Protocol": 1,
+                "Manifactor": 1,
+                "HardwareVersion": 2,
+                "SoftwareVersion": 11,
+                "LastRefreshDate": date,
+                "Date": date,
+                "SetTemp": self.set_temp,
+                "FirstCylinderOn": self.active[0],
+                "SecondCylinderOn": self.active[1],
+                "FT_Temp": round(self.temps[0]),
+                "STL_Temp": round(self.temps[1]),
+                "HasBoost": self.has_boost,
+                "Heater": any(self.active),
+                "EnergyD": round(self.energy_day, 2),
+                "EnergyN": round(self.energy_night, 2),
+                "SavedEnergy": self.saved_energy,
+                "PowerFlag": power_flag,
+            }
+        return self.reported
+
+    def device(self) -> dict:
+        return {
+            "id": self.id,
+            "realDeviceId": self.real_device_id,
+            "deviceType": 7,
+            "name": self.name,
+            "isOwner": True,
+            "ownerId": 1,
+            "ownerName": "Emulator",
+            "hwVersion": 2,
+            "swVersion": 11,
+            "usersWithAccess": 1,
+            "lastDataRefreshDate": self.reported.get("LastRefreshDate"),
+            "timeZoneId": 1,
+            "timeZoneName": "UTC",
+        }
+
+
+class EldomEmulator:
+    """aiohttp application emulating the Eldom cloud"""
+
+    def __init__(self, config: EmulatorConfig) -> None:
+        self.config = config
+        self._random = random.Random(config.seed)
+        self._tokens: set[str] = set()
+        self._sessions: dict[str, float] = {}
+        self.heaters = {
+            heater.id: heater
+            for heater in (
+                Heater(
+                    id=1000 + i,
+                    real_device_id=f"EMU{i:06d}",
+                    name=f"Heater {i + 1}",
+                    set_temp=self._random.randrange(45, 75),
+                    temps=[self._random.uniform(25, 60)] * 2,
+                )
+                for i in range(config.devices)
+            )
+        }
+        self.requests = 0
+        self.app = web.Application(middlewares=[self._faults])
+        self.app.add_routes(
+            [
+                web.get("/", self._index),
+                web.get("/Account/Login", self._login_page),
+                web.post("/Account/Login", self._login),
+                web.get("/api/user/get", self._user),
+                web.get("/api/device/getmy", self._devices),
+                web.post("/api/device/getmydevice", self._device),
+                web.post("/api/flatboiler/setTemperature", self._set_temperature),
+                web.post("/api/flatboiler/setHeater", self._set_heater),
+                web.post("/api/flatboiler/setState", self._set_state),
+                web.get("/api/flatboiler/{id}", self._state),
+                web.get("/api/flatboiler/{id}/wait", self._wait_state),
+            ]
+        )
+
+    @web.middleware
+    async def _faults(self, request: web.Request, handler):
+        self.requests += 1
+        config = self.config
+        delay = config.latency + self._random.uniform(0, config.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if request.path.startswith("/api/"):
+            if not self._authenticated(request):
+                raise web.HTTPFound("/Account/Login")
+            if self._random.random() < config.error_rate:
+                raise web.HTTPInternalServerError(text="injected error")
+        return await handler(request)
+
+    def _authenticated(self, request: web.Request) -> bool:
+        session = request.cookies.get(auth_cookie_name)
+        expires = self._sessions.get(session)
+        if expires is None:
+            return False
+        if expires and time.monotonic() > expires:
+            del self._sessions[session]
+            return False
+        return True
+
+    def _heater(self, id) -> Heater:
+        heater = self.heaters.get(int(id))
+        if heater is None:
+            raise web.HTTPNotFound()
+        heater.step(time.monotonic(), self.config)
+        return heater
+
+    def _heater_by_real_id(self, real_device_id: str) -> Heater:
+        for heater in self.heaters.values():
+            if heater.real_device_id == real_device_id:
+                return self._heater(heater.id)
+        raise web.HTTPNotFound()
+
+    async def _index(self, request: web.Request):
+        if not self._authenticated(request):
+            raise web.HTTPFound("/Account/Login")
+        return web.Response(text="<html><body>Eldom emulator</body></html>")
+
+    async def _login_page(self, request: web.Request):
+        token = secrets.token_urlsafe(16)
+        self._tokens.add(token)
+        return web.Response(text=login_page.format(token=token), content_type="text/html")
+
+    async def _login(self, request: web.Request):
+        form = await request.post()
+        token = form.get("__RequestVerificationToken")
+        if (
+            token not in self._tokens
+            or form.get("Email") != self.config.user
+            or form.get("Password") != self.config.password
+        ):
+            return await self._login_page(request)
+        self._tokens.discard(token)
+        session = secrets.token_urlsafe(32)
+        ttl = self.config.session_ttl
+        self._sessions[session] = time.monotonic() + ttl if ttl else 0
+        res = web.HTTPFound("/")
+        res.set_cookie(auth_cookie_name, session, httponly=True)
+        raise res
+
+    async def _user(self, request: web.Request):
+        return web.json_response(
+            {
+                "id": 1,
+                "email": self.config.user,
+                "firstName": "Eldom",
+                "lastName": "Emulator",
+                "language": 1,
+                "isActive": True,
+            }
+        )
+
+    async def _devices(self, request: web.Request):
+        now = time.monotonic()
+        result = []
+        for heater in self.heaters.values():
+            heater.step(now, self.config)
+            heater.report(now, self.config)
+            result.append(heater.device())
+        return web.json_response(result)
+
+    async def _device(self, request: web.Request):
+        body = await request.json()
+        heater = self._heater(body["deviceId"])
+        heater.report(time.monotonic(), self.config)
+        return web.json_response(heater.device())
+
+    async def _state(self, request: web.Request):
+        heater = self._heater(request.match_info["id"])
+        state = heater.report(time.monotonic(), self.config)
+        return web.json_response({"objectJson": json.dumps(state)})
+
+    async def _wait_state(self, request: web.Request):
+        """Long poll, answers once the state is refreshed after since"""
+        heater = self._heater(request.match_info["id"])
+        since = request.query.get("since")
+        timeout = min(float(request.query.get("timeout", 30)), 120)
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            heater.step(now, self.config)
+            state = heater.report(now, self.config)
+            if since is None or datetime.datetime.fromisoformat(
+                since
+            ) != datetime.datetime.fromisoformat(state["Date"]):
+                break
+            if now >= deadline:
+                break
+            next_refresh = heater.reported_at + self.config.refresh_interval
+            await asyncio.sleep(max(0.1, min(next_refresh, deadline) - now))
+        return web.json_response({"objectJson": json.dumps(state)})
+
+    def _command(self, heater: Heater, name: str, value) -> web.Response:
+        heater.pending.append((time.monotonic() + self.config.apply_delay, name, value))
+        return web.json_response({"status": True, "statusMessage": None})
+
+    async def _set_temperature(self, request: web.Request):
+        body = await request.json()
+        heater = self._heater_by_real_id(body["deviceId"])
+        temperature = int(body["temperature"])
+        if not 35 <= temperature <= 75:
+            return web.json_response(
+                {"status": False, "statusMessage": "temperature out of range"}
+            )
+        return self._command(heater, "set_temp", temperature)
+
+    async def _set_heater(self, request: web.Request):
+        body = await request.json()
+        heater = self._heater_by_real_id(body["deviceId"])
+        return self._command(heater, "has_boost", bool(body["heater"]))
+
+    async def _set_state(self, request: web.Request):
+        body = await request.json()
+        heater = self._heater_by_real_id(body["deviceId"])
+        state = int(body["state"])
+        if state not in range(5):
+            return web.json_response({"status": False, "statusMessage": "bad state"})
+        return self._command(heater, "state", state)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    defaults = EmulatorConfig()
+    for name in (
+        "devices",
+        "user",
+        "password",
+        "latency",
+        "jitter",
+        "error_rate",
+        "session_ttl",
+        "refresh_interval",
+        "apply_delay",
+        "time_scale",
+        "seed",
+    ):
+        default = getattr(defaults, name)
+        parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            type=type(default) if default is not None else int,
+            default=default,
+        )
+    args = parser.parse_args()
+    config = EmulatorConfig(
+        **{k: v for k, v in vars(args).items() if k not in ("host", "port")}
+    )
+    web.run_app(EldomEmulator(config).app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Latency report of Eldom request traces.
+
+Reads the JSONL files written by the integration when request tracing is on
+(including rotated ones) and prints latency percentiles per endpoint:
+
+    python -m tools.eldom_trace config/eldom_trace_*.jsonl*
+"""
+from __future__ import annotations
+
+import argparse
+from collections import defaultdict
+import json
+import math
+
+
+def percentile(values: list[float], q: float) -> float:
+    """nearest-rank percentile of sorted values"""
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[rank - 1]
+
+
+def load(paths: list[str]) -> dict[str, list[dict]]:
+    records: dict[str, list[dict]] = defaultdict(list)
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["endpoint"]].append(record)
+    return records
+
+
+def report(records: dict[str, list[dict]]) -> str:
+    header = (
+        f"{'endpoint':<40} {'count':>6} {'errors':>6} {'p50 ms':>8} "
+        f"{'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'avg bytes':>9}"
+    )
+    lines = [header, "-" * len(header)]
+    for endpoint, items in sorted(records.items()):
+        durations = sorted(r["duration"] * 1000 for r in items)
+        errors = sum(1 for r in items if r["error"] or (r["status"] or 0) >= 400)
+        size = sum(r["size"] for r in items) / len(items)
+        lines.append(
+            f"{endpoint:<40} {len(items):>6} {errors:>6} "
+            f"{percentile(durations, 50):>8.1f} {percentile(durations, 95):>8.1f} "
+            f"{percentile(durations, 99):>8.1f} {durations[-1]:>8.1f} {size:>9.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="+", help="trace files")
+    args = parser.parse_args()
+    print(report(load(args.files)))
+
+
+if __name__ == "__main__":
+    main()